@@ -0,0 +1,113 @@
+"""
+Compares answer prompts built from the full episode recap with prompts built from the top-m recap parts
+most similar to the requested theme: prompt tokens per answer and latency of answering k candidates.
+
+By default the answers go to the fake OpenAI server, whose prefill time grows with the prompt. With --real-openai
+they go to the API configured by OPENAI_API_KEY / OPENAI_BASE_URL, which gives real token counts and latencies.
+
+Run from the backend directory:
+    python benchmarks/answer_prompt_benchmark.py --top-parts 2 3 4 --output answer_prompt_benchmark.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from api_benchmark import DEFAULT_QUERIES, free_port, git_commit, serve_in_background
+from fake_openai import FakeOpenAiConfig, create_app
+from fixture_graph import FixtureGraphService
+
+from api.metrics import LLM_TOKENS  # noqa: E402
+from api.services.llm import LlmService  # noqa: E402
+from api.services.store import ThemeStore  # noqa: E402
+from api.services.themes import ThemesService  # noqa: E402
+
+
+def answer_prompt_tokens() -> float:
+    return sum(
+        s.value
+        for metric in LLM_TOKENS.collect()
+        for s in metric.samples
+        if s.name.endswith('_total') and s.labels['operation'] == 'answer' and s.labels['kind'] == 'prompt'
+    )
+
+
+async def measure(themes_service: ThemesService, llm_service: LlmService, theme_store: ThemeStore,
+                  queries: list[str], k: int) -> dict:
+    latencies = []
+    tokens_before = answer_prompt_tokens()
+    for query in queries:
+        theme_embedding = await llm_service.create_embedding(query)
+        similar_themes = theme_store.find_similar_themes(theme_embedding, k)
+        start = time.perf_counter()
+        await asyncio.gather(*(themes_service.get_theme_answer(query, t, theme_embedding) for t, _ in similar_themes))
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'prompt_tokens_per_answer': (answer_prompt_tokens() - tokens_before) / (len(queries) * k),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+    }
+
+
+async def run(queries: list[str], top_parts: list[int], k: int) -> dict:
+    graph_service = FixtureGraphService()
+    theme_store = ThemeStore(tempfile.mkdtemp(prefix='bluey-benchmark-'))
+    theme_store.load(graph_service)
+    llm_service = LlmService()
+
+    results = {}
+    for m in [0, *top_parts]:
+        themes_service = ThemesService(graph_service, llm_service, theme_store, recap_top_parts=m)
+        results['full' if m == 0 else f'top{m}'] = await measure(themes_service, llm_service, theme_store, queries, k)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Full-recap vs top-m recap part answer prompts')
+    parser.add_argument('--top-parts', type=int, nargs='+', default=[3])
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--queries', help='File with one query theme per line')
+    parser.add_argument('--chat-latency-ms', type=float, default=300)
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=2000)
+    parser.add_argument('--real-openai', action='store_true', help='Send the prompts to the real OpenAI API')
+    parser.add_argument('--output', default='answer_prompt_benchmark.json')
+    args = parser.parse_args()
+
+    fake_openai_config = FakeOpenAiConfig(
+        chat_latency_ms=args.chat_latency_ms,
+        prompt_tokens_per_second=args.prompt_tokens_per_second
+    )
+    if not args.real_openai:
+        openai_port = free_port()
+        serve_in_background(create_app(fake_openai_config), openai_port)
+        os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{openai_port}/v1'
+        os.environ['OPENAI_API_KEY'] = 'fake'
+
+    if args.queries:
+        with open(args.queries, encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = DEFAULT_QUERIES
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'config': {
+            'k': args.k,
+            'queries': len(queries),
+            'fake_openai': None if args.real_openai else vars(fake_openai_config),
+        },
+        'results': asyncio.run(run(queries, args.top_parts, args.k)),
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+
+    full = result['results']['full']
+    for name, r in result['results'].items():
+        print(f'{name:>6}: {r["prompt_tokens_per_answer"]:7.0f} prompt tokens/answer '
+              f'({r["prompt_tokens_per_answer"] / full["prompt_tokens_per_answer"] - 1:+.0%}), '
+              f'p50 {r["p50_ms"]:7.1f}ms, mean {r["mean_ms"]:7.1f}ms')
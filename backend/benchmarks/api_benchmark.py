@@ -0,0 +1,198 @@
+"""
+Load-tests /themes/find_similar offline: the API runs against a fake OpenAI server and a fixture graph built
+from src/etl/data, so results only reflect our own code plus the simulated upstream latencies.
+
+Run from the backend directory:
+    python benchmarks/api_benchmark.py --concurrency 8 --requests 200 --output bench.json
+    python benchmarks/api_benchmark.py --compare bench.json --output bench-new.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from fake_openai import FakeOpenAiConfig, create_app
+from fixture_graph import FixtureGraphService
+
+DEFAULT_QUERIES = [
+    "Recognizing the significance of guidelines",
+    "Solving conflicts between siblings",
+    "Turning mundane tasks to games",
+    "Dealing with disappointment",
+    "Learning to share",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve_in_background(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def wait_until_ready(base_url: str, timeout_seconds=60):
+    deadline = time.monotonic() + timeout_seconds
+    while httpx.get(f'{base_url}/ready').status_code != 200:
+        if time.monotonic() > deadline:
+            raise TimeoutError('API did not become ready')
+        time.sleep(0.1)
+
+
+def create_api_app(openai_port: int, enable_caches: bool):
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{openai_port}/v1'
+    os.environ['OPENAI_API_KEY'] = 'fake'
+    os.environ['THEME_STORE_DIR'] = tempfile.mkdtemp(prefix='bluey-benchmark-')
+    os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(os.environ['THEME_STORE_DIR'], 'cache.sqlite3'))
+    os.environ.setdefault('ANSWER_WAREHOUSE_PATH', os.path.join(os.environ['THEME_STORE_DIR'], 'answer_warehouse.sqlite3'))
+    if not enable_caches:
+        os.environ['CACHE_MAX_ENTRIES'] = '0'
+        os.environ['SEMANTIC_CACHE_SIZE'] = '0'
+    os.environ.setdefault('NEO4J_URI', 'bolt://127.0.0.1:7687')
+    os.environ.setdefault('NEO4J_USERNAME', 'neo4j')
+    os.environ.setdefault('NEO4J_PASSWORD', 'neo4j')
+
+    import api.app as api_app
+
+    logging.getLogger('api.app').setLevel(logging.WARNING)
+    api_app.graph_service = FixtureGraphService()
+    api_app.themes_service = api_app.create_themes_service(api_app.graph_service)
+    return api_app.app
+
+
+async def drive(url: str, queries: list[str], concurrency: int, total_requests: int) -> tuple[list[float], int, float]:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client: httpx.AsyncClient, i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json={'theme': queries[i % len(queries)]})
+            except httpx.HTTPError:
+                errors += 1
+                return
+            elapsed = time.perf_counter() - start
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(total_requests)))
+        wall_time = time.perf_counter() - start
+
+    return latencies, errors, wall_time
+
+
+def summarize(latencies: list[float], errors: int, wall_time: float) -> dict:
+    # Quantiles need two successful requests, a run where the API mostly errored is still recorded with its errors
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = (quantiles[i] * 1000 for i in (49, 94, 98))
+    else:
+        p50 = p95 = p99 = latencies[0] * 1000 if latencies else None
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else None,
+        'throughput_rps': len(latencies) / wall_time,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict):
+    for key in ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps']:
+        before, after = baseline['results'][key], current['results'][key]
+        if not before or after is None:
+            print(f'{key:>15}: {before} -> {after}')
+            continue
+        print(f'{key:>15}: {before:10.1f} -> {after:10.1f} ({(after - before) / before:+.1%})')
+    print(f"{'errors':>15}: {baseline['results']['errors']:10d} -> {current['results']['errors']:10d}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline load test for /themes/find_similar')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--warmup-requests', type=int, default=5)
+    parser.add_argument('--queries', help='File with one query theme per line')
+    parser.add_argument('--embedding-latency-ms', type=float, default=50)
+    parser.add_argument('--chat-latency-ms', type=float, default=300)
+    parser.add_argument('--tokens-per-second', type=float, default=100)
+    parser.add_argument('--completion-tokens', type=int, default=60)
+    parser.add_argument('--malformed-json-rate', type=float, default=0.0)
+    parser.add_argument('--enable-caches', action='store_true', help='Keep the embedding, answer and semantic caches on')
+    parser.add_argument('--output', default='api_benchmark.json')
+    parser.add_argument('--compare', help='Previous result file to compare against')
+    args = parser.parse_args()
+
+    fake_openai_config = FakeOpenAiConfig(
+        embedding_latency_ms=args.embedding_latency_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        malformed_json_rate=args.malformed_json_rate
+    )
+    openai_port, api_port = free_port(), free_port()
+    serve_in_background(create_app(fake_openai_config), openai_port)
+    serve_in_background(create_api_app(openai_port, args.enable_caches), api_port)
+
+    if args.queries:
+        with open(args.queries, encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = DEFAULT_QUERIES
+
+    wait_until_ready(f'http://127.0.0.1:{api_port}')
+    url = f'http://127.0.0.1:{api_port}/themes/find_similar'
+    asyncio.run(drive(url, queries, args.concurrency, args.warmup_requests))
+    latencies, errors, wall_time = asyncio.run(drive(url, queries, args.concurrency, args.requests))
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'config': {
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'queries': len(queries),
+            'caches': args.enable_caches,
+            'fake_openai': vars(fake_openai_config),
+        },
+        'results': summarize(latencies, errors, wall_time),
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result['results'], indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), result)
@@ -0,0 +1,124 @@
+"""
+Measures scrape and parse throughput of the extractors in src/etl/extract.py without hitting Fandom.
+
+Record a fixture archive once (this is the only step that talks to the live wiki):
+    python benchmarks/etl_benchmark.py record --episodes 20
+Replay it through a local server with simulated latency:
+    python benchmarks/etl_benchmark.py run --latency-ms 20 --output etl_benchmark.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from wiki_fixtures import PageArchive, RecordingServer, ReplayServer
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+DEFAULT_ARCHIVE = os.path.join(os.path.dirname(__file__), 'fixtures', 'wiki_pages.json.gz')
+
+sys.path.insert(0, os.path.join(SRC_DIR, 'etl'))
+
+import extract  # noqa: E402
+
+
+def record(archive_path: str, episodes_limit: int):
+    archive = PageArchive()
+    server = RecordingServer(archive).start()
+    extract.BASE_URL = server.base_url
+    try:
+        episodes = extract.get_episodes()[:episodes_limit]
+        extract.get_recap_parts(episodes)
+        extract.get_appearances(episodes)
+        extract.get_relations(extract.get_characters())
+    finally:
+        server.stop()
+
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    archive.save(archive_path)
+    print(f'Recorded {len(archive.pages)} pages to {archive_path}')
+
+
+def measure(name: str, server: ReplayServer, fn: Callable[[], object]) -> dict:
+    extract.ids_cache.clear()
+    pages_before, serving_before = server.pages_served, server.serving_seconds
+    tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    pages = server.pages_served - pages_before
+    serving_seconds = server.serving_seconds - serving_before
+    result = {
+        'pages': pages,
+        'seconds': elapsed,
+        'pages_per_second': pages / elapsed if elapsed else 0.0,
+        # Client-side time per page: HTML parsing plus requests' own overhead
+        'parse_ms_per_page': (elapsed - serving_seconds) / pages * 1000 if pages else 0.0,
+        'peak_memory_mb': peak_bytes / 2 ** 20,
+    }
+    print(f'{name:>26}: {pages:5d} pages, {result["pages_per_second"]:8.1f} pages/s, '
+          f'{result["parse_ms_per_page"]:7.2f} ms parse/page, {result["peak_memory_mb"]:7.1f} MB peak')
+    return result
+
+
+def run(archive_path: str, latency_ms: float) -> dict:
+    archive = PageArchive.load(archive_path)
+    server = ReplayServer(archive, latency_ms).start()
+    extract.BASE_URL = server.base_url
+
+    try:
+        episodes = extract.get_episodes()
+        recorded_episodes = [e for e in episodes if e['wiki_url'] in archive.pages]
+        characters = extract.get_characters()
+        character_urls = [f'/wiki/{c["id"].removeprefix("Character:")}' for c in characters]
+
+        tracemalloc.start()
+        results = {
+            'get_episodes': measure('get_episodes', server, extract.get_episodes),
+            'get_recap': measure('get_recap', server, lambda: [
+                extract.get_recap(e['wiki_url']) for e in recorded_episodes
+            ]),
+            'get_appearances_from_wiki': measure('get_appearances_from_wiki', server, lambda: [
+                extract.get_appearances_from_wiki(e['wiki_url']) for e in recorded_episodes
+            ]),
+            'get_relations': measure('get_relations', server, lambda: extract.get_relations(characters)),
+            'build_id_from_url': measure('build_id_from_url', server, lambda: [
+                extract.build_id_from_url(url) for url in character_urls
+            ]),
+        }
+        tracemalloc.stop()
+    finally:
+        server.stop()
+
+    return {
+        'timestamp': time.time(),
+        'config': {'latency_ms': latency_ms, 'pages_in_archive': len(archive.pages)},
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline scrape and parse benchmark for the ETL extractors')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Record wiki pages into a fixture archive')
+    record_parser.add_argument('--archive', default=DEFAULT_ARCHIVE)
+    record_parser.add_argument('--episodes', type=int, default=20, help='Number of episodes to record')
+
+    run_parser = subparsers.add_parser('run', help='Benchmark the extractors against the recorded archive')
+    run_parser.add_argument('--archive', default=DEFAULT_ARCHIVE)
+    run_parser.add_argument('--latency-ms', type=float, default=0)
+    run_parser.add_argument('--output', default='etl_benchmark.json')
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args.archive, args.episodes)
+    else:
+        result = run(args.archive, args.latency_ms)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
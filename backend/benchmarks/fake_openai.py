@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+
+EMBEDDING_DIMENSIONS = 1536
+
+_WORD_PATTERN = re.compile(r'\w+')
+_THEME_ID_PATTERN = re.compile(r'"id": "(Theme:[^"]+)"')
+
+
+@dataclass
+class FakeOpenAiConfig:
+    embedding_latency_ms: float = 50
+    chat_latency_ms: float = 300
+    tokens_per_second: float = 100
+    completion_tokens: int = 60
+    prompt_tokens_per_second: float | None = None  # Simulates prefill time growing with the prompt when set
+    malformed_json_rate: float = 0.0  # Fraction of JSON mode replies cut off halfway
+
+
+def fake_embedding(text: str) -> list[float]:
+    # Hashed bag of words: texts sharing words get similar vectors, so vector search still ranks sensibly
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in _WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        index = int.from_bytes(digest[:4], 'little') % EMBEDDING_DIMENSIONS
+        vector[index] += 1.0 if digest[4] % 2 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _fake_json_answer(prompt: str, completion_tokens: int) -> str:
+    ids = _THEME_ID_PATTERN.findall(prompt)
+    if '"answers"' in prompt:
+        return json.dumps({'answers': {i: ' '.join(['word'] * completion_tokens) for i in ids}})
+    return json.dumps({'ids': ids[:1]})
+
+
+def create_app(config: FakeOpenAiConfig) -> FastAPI:
+    app = FastAPI()
+
+    @app.post('/v1/embeddings')
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        await asyncio.sleep(config.embedding_latency_ms / 1000)
+        prompt_tokens = sum(_count_tokens(i) for i in inputs)
+        return {
+            'object': 'list',
+            'model': body['model'],
+            'data': [
+                {'object': 'embedding', 'index': i, 'embedding': fake_embedding(text)}
+                for i, text in enumerate(inputs)
+            ],
+            'usage': {'prompt_tokens': prompt_tokens, 'total_tokens': prompt_tokens}
+        }
+
+    @app.post('/v1/chat/completions')
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = '\n'.join(m['content'] for m in body['messages'])
+        requires_json = (body.get('response_format') or {}).get('type') == 'json_object'
+
+        if requires_json:
+            content = _fake_json_answer(prompt, config.completion_tokens)
+            if random.random() < config.malformed_json_rate:
+                content = content[:len(content) // 2]
+            completion_tokens = _count_tokens(content)
+        else:
+            content = ' '.join(['word'] * config.completion_tokens)
+            completion_tokens = config.completion_tokens
+        prompt_tokens = _count_tokens(prompt)
+        prefill_seconds = prompt_tokens / config.prompt_tokens_per_second if config.prompt_tokens_per_second else 0
+        await asyncio.sleep(config.chat_latency_ms / 1000 + prefill_seconds + completion_tokens / config.tokens_per_second)
+
+        return {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body['model'],
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content}
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    return app
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from fake_openai import fake_embedding
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+DATA_DIR = os.path.join(SRC_DIR, 'etl', 'data')
+
+sys.path[:0] = [SRC_DIR, os.path.join(SRC_DIR, 'etl')]
+
+from codec import read_csv  # noqa: E402
+from schema import CHARACTERS, EDGES, EPISODES, RECAP_PARTS, THEMES  # noqa: E402
+
+from api.models import Theme, Recap  # noqa: E402
+
+
+class FixtureGraphService:
+    def __init__(self, data_dir=DATA_DIR):
+        episodes = {e['id']: e for e in read_csv(os.path.join(data_dir, 'episodes.csv'), EPISODES)}
+
+        recap_parts = defaultdict(list)
+        for part in read_csv(os.path.join(data_dir, 'recap_parts.csv'), RECAP_PARTS):
+            recap_parts[part['episode_id']].append(part)
+
+        self._episodes = [
+            {
+                'id': e['id'],
+                'title': e['title'],
+                'wiki_url': e['wiki_url'],
+                'recap_parts': [
+                    {'text': p['text'], 'embedding': fake_embedding(p['text'])}
+                    for p in sorted(recap_parts[e['id']], key=lambda p: p['index'])
+                ]
+            }
+            for e in episodes.values()
+        ]
+        self._theme_rows = list(read_csv(os.path.join(data_dir, 'themes.csv'), THEMES))
+
+        appearances = defaultdict(set)
+        for edge in read_csv(os.path.join(data_dir, 'appearances.csv'), EDGES):
+            if edge['target_id'] in episodes:
+                appearances[edge['source_id']].add(edge['target_id'])
+        self._characters = [
+            {'id': c['id'], 'name': c['name'], 'episode_ids': sorted(appearances[c['id']])}
+            for c in sorted(read_csv(os.path.join(data_dir, 'characters.csv'), CHARACTERS), key=lambda c: c['id'])
+        ]
+
+        self._themes = []
+        self._episode_titles = []
+        self._recap_parts = []
+        for t in self._theme_rows:
+            episode = episodes[t['episode_id']]
+            parts = sorted(recap_parts[t['episode_id']], key=lambda p: p['index'])
+            self._themes.append(Theme(
+                semantic_id=t['id'],
+                episode_title=episode['title'],
+                episode_url=episode['wiki_url'],
+                title=t['title'],
+                description=t['description'],
+                explanation=t['explanation'],
+                supporting_quotes=t['supporting_quotes'],
+                recap='\n'.join(p['text'] for p in parts)
+            ))
+            self._episode_titles.append(episode['title'])
+            self._recap_parts.append([p['text'] for p in parts])
+
+        self._embeddings = np.array(
+            [fake_embedding(f'{t.title}\n{t.description}') for t in self._themes],
+            dtype=np.float32
+        )
+
+    def connect(self):
+        pass
+
+    def warm_up(self, connections: int):
+        pass
+
+    def close(self):
+        pass
+
+    def find_similar_themes(self, vector: list[float], k=5, timeout: float | None = None) -> list[(Theme, float)]:
+        scores = self._embeddings @ np.asarray(vector, dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        return [(self._themes[i], float(scores[i])) for i in top]
+
+    def fingerprint(self) -> str:
+        return json.dumps({'themes': len(self._theme_rows), 'max_theme_id': max(t['id'] for t in self._theme_rows)})
+
+    def export_episodes(self) -> list[dict]:
+        return self._episodes
+
+    def export_characters(self) -> list[dict]:
+        return self._characters
+
+    def export_themes(self) -> list[dict]:
+        return [
+            {
+                'semantic_id': t['id'],
+                'episode_id': t['episode_id'],
+                'title': t['title'],
+                'description': t['description'],
+                'explanation': t['explanation'],
+                'supporting_quotes': t['supporting_quotes'],
+                'embedding': embedding.tolist()
+            }
+            for t, embedding in zip(self._theme_rows, self._embeddings)
+        ]
+
+    def find_recap_by_theme_id(self, theme_semantic_id: str) -> Recap:
+        i = next(i for i, t in enumerate(self._themes) if t.semantic_id == theme_semantic_id)
+        return Recap(episode_title=self._episode_titles[i], parts=self._recap_parts[i])
@@ -0,0 +1,115 @@
+import gzip
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+UPSTREAM_URL = 'https://blueypedia.fandom.com'
+
+
+class PageArchive:
+    def __init__(self, pages: dict[str, dict] | None = None):
+        self.pages = pages or {}
+
+    @classmethod
+    def load(cls, path: str) -> 'PageArchive':
+        with gzip.open(path, mode='rt', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path: str):
+        with gzip.open(path, mode='wt', encoding='utf-8') as f:
+            json.dump(self.pages, f)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: '_WikiServer'
+
+    def do_GET(self):
+        start = time.perf_counter()
+        page = self.server.get_page(self.path)
+        if page is None:
+            self.send_error(404)
+        else:
+            body = page['body'].encode('utf-8')
+            self.send_response(page['status'])
+            if 'location' in page:
+                self.send_header('Location', page['location'])
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        self.server.on_served(time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _WikiServer(ThreadingHTTPServer, ABC):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self) -> '_WikiServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    @abstractmethod
+    def get_page(self, path: str) -> dict | None:
+        pass
+
+    def on_served(self, seconds: float):
+        pass
+
+
+class RecordingServer(_WikiServer):
+    # Redirects are stored as hops rather than followed so build_id_from_url resolves ids the same way on replay
+    def __init__(self, archive: PageArchive):
+        super().__init__()
+        self._archive = archive
+        self._lock = threading.Lock()
+
+    def get_page(self, path: str) -> dict | None:
+        with self._lock:
+            if path in self._archive.pages:
+                return self._archive.pages[path]
+
+        response = requests.get(f'{UPSTREAM_URL}{path}', allow_redirects=False)
+        page = {'status': response.status_code, 'body': response.text}
+        if response.is_redirect:
+            page['location'] = response.headers['Location'].removeprefix(UPSTREAM_URL)
+
+        with self._lock:
+            self._archive.pages[path] = page
+        return page
+
+
+class ReplayServer(_WikiServer):
+    def __init__(self, archive: PageArchive, latency_ms: float = 0):
+        super().__init__()
+        self._archive = archive
+        self._latency_seconds = latency_ms / 1000
+        self._lock = threading.Lock()
+        self.pages_served = 0
+        self.serving_seconds = 0.0
+
+    def get_page(self, path: str) -> dict | None:
+        time.sleep(self._latency_seconds)
+        return self._archive.pages.get(path)
+
+    def on_served(self, seconds: float):
+        with self._lock:
+            self.pages_served += 1
+            self.serving_seconds += seconds
@@ -1,18 +1,58 @@
+import asyncio
 import logging
 import os
+import tempfile
+import time
 from dataclasses import asdict
 from dataclasses import dataclass
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from api.metrics import collect_server_timings, format_server_timing, record_request, render_metrics, track_stage
+from api.profiling import SamplingProfiler
+from api.services.cache import SharedCache
+from api.services.deadline import Deadline
 from api.services.graph import GraphService
+from api.services.lexical import LexicalIndex
 from api.services.llm import LlmService
-from api.services.themes import ThemesService
+from api.services.semantic_cache import SemanticCache
+from api.services.store import ThemeStore
+from api.services.themes import ThemesService, ThemeStoreNotLoadedError
+from api.services.warehouse import AnswerWarehouse
 
 uri = os.environ["NEO4J_URI"]
 username = os.environ["NEO4J_USERNAME"]
 password = os.environ["NEO4J_PASSWORD"]
+slow_request_profile_ms = os.environ.get("SLOW_REQUEST_PROFILE_MS")
+profiler_interval_ms = float(os.environ.get("PROFILER_INTERVAL_MS", "5"))
+warm_up_connections = int(os.environ.get("WARM_UP_CONNECTIONS", "4"))
+warm_up_retry_seconds = float(os.environ.get("WARM_UP_RETRY_SECONDS", "5"))
+theme_store_dir = os.environ.get("THEME_STORE_DIR", os.path.join(tempfile.gettempdir(), "bluey-theme-store"))
+# Kept apart from the theme store, which may live on a small tmpfs such as /dev/shm
+shared_cache_path = os.environ.get("SHARED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "bluey-cache", "cache.sqlite3"))
+cache_max_entries = int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))
+semantic_cache_size = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1000"))
+semantic_cache_threshold = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+semantic_cache_verify_rate = float(os.environ.get("SEMANTIC_CACHE_VERIFY_RATE", "0.05"))
+best_match_mode = os.environ.get("BEST_MATCH_MODE", "llm")
+lexical_mode = os.environ.get("LEXICAL_MODE", "hybrid")
+lexical_fast_path_min_score = float(os.environ.get("LEXICAL_FAST_PATH_MIN_SCORE", "4.0"))
+recap_top_parts = int(os.environ.get("RECAP_TOP_PARTS", "3"))
+answer_mode = os.environ.get("ANSWER_MODE", "parallel")
+request_deadline_ms = float(os.environ.get("REQUEST_DEADLINE_MS", "10000"))
+llm_hedge_after_ms = float(os.environ.get("LLM_HEDGE_AFTER_MS", "0"))
+answer_warehouse_path = os.environ.get(
+    "ANSWER_WAREHOUSE_PATH", os.path.join(os.path.dirname(__file__), "..", "etl", "data", "answer_warehouse.sqlite3")
+)
+# Settings a precomputed answer depends on, recorded when the warehouse is built and checked before serving from it.
+# The lexical fast path is never used to build the warehouse, its ranking is the hybrid one.
+answer_warehouse_config = {
+    "answer_mode": answer_mode,
+    "best_match_mode": best_match_mode,
+    "lexical_mode": "hybrid" if lexical_mode == "fast" else lexical_mode,
+    "recap_top_parts": str(recap_top_parts),
+}
 
 app = FastAPI()
 app.add_middleware(
@@ -35,16 +75,75 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 @dataclass
 class FindSimilarThemesRequest:
     theme: str
+    character_id: str | None = None
+
+
+def create_shared_cache(name: str) -> SharedCache | None:
+    if cache_max_entries <= 0:
+        return None
+    os.makedirs(os.path.dirname(shared_cache_path), exist_ok=True)
+    return SharedCache(shared_cache_path, name, cache_max_entries)
+
+
+def create_themes_service(graph_service: GraphService) -> ThemesService:
+    return ThemesService(
+        graph_service,
+        llm_service,
+        theme_store,
+        answer_cache=create_shared_cache("answers"),
+        semantic_cache=SemanticCache(semantic_cache_threshold, semantic_cache_size) if semantic_cache_size > 0 else None,
+        semantic_cache_verify_rate=semantic_cache_verify_rate,
+        best_match_mode=best_match_mode,
+        lexical_index=lexical_index,
+        lexical_mode=lexical_mode,
+        lexical_fast_path_min_score=lexical_fast_path_min_score,
+        recap_top_parts=recap_top_parts,
+        answer_mode=answer_mode,
+        answer_warehouse=answer_warehouse
+    )
 
 
 graph_service = GraphService(uri, username, password)
-llm_service = LlmService()
-themes_service = ThemesService(graph_service, llm_service)
+theme_store = ThemeStore(theme_store_dir)
+lexical_index = LexicalIndex()
+answer_warehouse = AnswerWarehouse(answer_warehouse_path, answer_warehouse_config)
+llm_service = LlmService(create_shared_cache("embeddings"), hedge_after_seconds=llm_hedge_after_ms / 1000 or None)
+themes_service = create_themes_service(graph_service)
+is_ready = False
+in_flight_requests = 0
+active_profiler: SamplingProfiler | None = None
+warm_up_task: asyncio.Task | None = None
+
+
+async def warm_up():
+    start = time.perf_counter()
+    await asyncio.to_thread(graph_service.warm_up, warm_up_connections)
+    await asyncio.to_thread(theme_store.load, graph_service)
+    if lexical_mode != "off":
+        await asyncio.to_thread(lexical_index.build, theme_store)
+    await themes_service.warm_up()
+    if answer_warehouse and answer_warehouse.version and answer_warehouse.version != theme_store.version:
+        logger.warning(f"Answer warehouse version {answer_warehouse.version} does not match the theme store "
+                       f"version {theme_store.version}, it will not be used until it is rebuilt")
+    logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+
+async def warm_up_until_ready():
+    global is_ready
+    while not is_ready:
+        try:
+            await warm_up()
+            is_ready = True
+        except Exception as e:
+            logger.warning(f"Warm-up failed, retrying in {warm_up_retry_seconds}s: {e}")
+            await asyncio.sleep(warm_up_retry_seconds)
 
 
 @app.on_event("startup")
 async def startup_event():
+    global warm_up_task
     graph_service.connect()
+    warm_up_task = asyncio.create_task(warm_up_until_ready())
 
 
 @app.on_event("shutdown")
@@ -52,14 +151,90 @@ async def shutdown_event():
     graph_service.close()
 
 
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    global in_flight_requests, active_profiler
+    in_flight_requests += 1
+    # The profiler samples the whole process, so a profile is only reported for requests that ran alone
+    if active_profiler:
+        active_profiler.overlapped = True
+    profiler = None
+    if slow_request_profile_ms and in_flight_requests == 1:
+        profiler = active_profiler = SamplingProfiler(profiler_interval_ms / 1000)
+        profiler.start()
+
+    start = time.perf_counter()
+    try:
+        with collect_server_timings() as timings:
+            response = await call_next(request)
+    finally:
+        in_flight_requests -= 1
+        if profiler:
+            profiler.stop()
+            active_profiler = None
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    record_request(request.method, route.path if route else "unmatched", response.status_code, elapsed)
+    response.headers["Server-Timing"] = format_server_timing([*timings, ("total", elapsed)])
+
+    if profiler and not profiler.overlapped and elapsed * 1000 >= float(slow_request_profile_ms):
+        logger.warning(f"Slow request {request.method} {request.url.path} took {elapsed:.3f}s:\n{profiler.report()}")
+
+    return response
+
+
 @app.get("/")
 async def health():
     return 'healthy'
 
 
+@app.get("/ready")
+async def ready(response: Response):
+    if not is_ready:
+        response.status_code = 503
+        return 'warming up'
+    return 'ready'
+
+
+@app.get("/metrics")
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 @app.post("/themes/find_similar")
 async def find_similar_themes(request: FindSimilarThemesRequest):
     logger.info(f"Received request: {request.theme}")
-    themes = asdict(themes_service.find_similar_themes(request.theme))
+    deadline = Deadline.after(request_deadline_ms / 1000) if request_deadline_ms > 0 else None
+    if request.character_id and theme_store.is_loaded and not theme_store.get_character(request.character_id):
+        raise HTTPException(status_code=404, detail=f"Unknown character {request.character_id}")
+    try:
+        similar_themes = await themes_service.find_similar_themes(
+            request.theme, deadline=deadline, character_id=request.character_id
+        )
+    except TimeoutError:
+        logger.warning(f"Request for '{request.theme}' ran out of time before any candidates were found")
+        raise HTTPException(status_code=504, detail="Finding similar themes took too long")
+    except ThemeStoreNotLoadedError:
+        raise HTTPException(status_code=503, detail="Still warming up")
+    with track_stage('serialization'):
+        themes = asdict(similar_themes)
     logger.info(f"Returning response for '{request.theme}': {themes}")
     return themes
+
+
+@app.get("/characters")
+async def characters():
+    if not theme_store.is_loaded:
+        raise HTTPException(status_code=503, detail="Still warming up")
+    return [asdict(c) for c in theme_store.characters]
+
+
+@app.get("/characters/{character_id}/themes")
+async def character_themes(character_id: str):
+    if not theme_store.is_loaded:
+        raise HTTPException(status_code=503, detail="Still warming up")
+    if not (result := themes_service.get_character_themes(character_id)):
+        raise HTTPException(status_code=404, detail=f"Unknown character {character_id}")
+    return asdict(result)
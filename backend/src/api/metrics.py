@@ -0,0 +1,117 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+_LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2, 4, 8, 16, 32)
+
+REQUEST_LATENCY = Histogram(
+    'bluey_http_request_latency_seconds', 'End-to-end latency of HTTP requests',
+    ['method', 'path', 'status'], buckets=_LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    'bluey_stage_latency_seconds', 'Latency of request pipeline stages',
+    ['stage'], buckets=_LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    'bluey_llm_call_latency_seconds', 'Latency of individual LLM API calls',
+    ['model', 'operation'], buckets=_LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    'bluey_llm_tokens', 'Tokens consumed by LLM API calls',
+    ['model', 'operation', 'kind']
+)
+LLM_HEDGES = Counter(
+    'bluey_llm_hedged_calls', 'Straggling LLM calls that were duplicated, by which request answered first',
+    ['model', 'operation', 'winner']
+)
+NEO4J_LATENCY = Histogram(
+    'bluey_neo4j_query_latency_seconds', 'Latency of Neo4j queries',
+    ['query'], buckets=_LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    'bluey_cache_lookups', 'Cache lookups by result',
+    ['cache', 'result']
+)
+SEMANTIC_CACHE_VERIFICATIONS = Counter(
+    'bluey_semantic_cache_verifications', 'Sampled semantic cache hits checked against a fresh vector query',
+    ['result']
+)
+
+_server_timings: ContextVar[list[tuple[str, float]] | None] = ContextVar('server_timings', default=None)
+
+
+@contextmanager
+def collect_server_timings() -> Iterator[list[tuple[str, float]]]:
+    timings = []
+    token = _server_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _server_timings.reset(token)
+
+
+def format_server_timing(timings: list[tuple[str, float]]) -> str:
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings)
+
+
+@contextmanager
+def _track(histogram: Histogram, timing_name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.labels(**labels).observe(elapsed)
+        timings = _server_timings.get()
+        if timings is not None:
+            timings.append((timing_name, elapsed))
+
+
+def track_stage(stage: str):
+    return _track(STAGE_LATENCY, stage, stage=stage)
+
+
+def track_llm_call(model: str, operation: str):
+    return _track(LLM_LATENCY, f'llm_{operation}', model=model, operation=operation)
+
+
+def track_neo4j_query(query: str):
+    return _track(NEO4J_LATENCY, f'neo4j_{query}', query=query)
+
+
+def record_request(method: str, path: str, status: int, seconds: float):
+    REQUEST_LATENCY.labels(method=method, path=path, status=str(status)).observe(seconds)
+
+
+def record_llm_usage(model: str, operation: str, usage):
+    if usage is None:
+        return
+    LLM_TOKENS.labels(model=model, operation=operation, kind='prompt').inc(usage.prompt_tokens)
+    LLM_TOKENS.labels(model=model, operation=operation, kind='completion').inc(getattr(usage, 'completion_tokens', 0))
+
+
+def record_llm_hedge(model: str, operation: str, hedge_won: bool):
+    LLM_HEDGES.labels(model=model, operation=operation, winner='hedge' if hedge_won else 'original').inc()
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_semantic_cache_verification(is_false_hit: bool):
+    SEMANTIC_CACHE_VERIFICATIONS.labels(result='false_hit' if is_false_hit else 'match').inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    # With several workers each one writes its samples to the shared directory, aggregate them all
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
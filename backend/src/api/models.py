@@ -27,9 +27,12 @@ class ThemeResponse:
 @dataclass
 class SimilarTheme:
     theme: ThemeResponse
-    score: float
+    score: float | None  # Cosine similarity to the requested theme, None for keyword matches that skip the embedding
     is_best_match: bool
-    answer: str
+    answer: str | None
+    answer_pending: bool = False  # The answer was not ready before the request deadline
+    match_source: str = 'vector'  # 'lexical' when found by keywords alone
+    lexical_score: float | None = None  # BM25 score of a keyword match
 
 
 @dataclass
@@ -41,3 +44,16 @@ class SimilarThemes:
 class Recap:
     episode_title: str
     parts: list[str]
+
+
+@dataclass
+class Character:
+    id: str
+    name: str
+    episode_count: int
+
+
+@dataclass
+class CharacterThemes:
+    character: Character
+    themes: list[ThemeResponse]
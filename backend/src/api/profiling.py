@@ -0,0 +1,42 @@
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    def __init__(self, interval_seconds: float):
+        self._interval_seconds = interval_seconds
+        self._stacks = Counter()
+        self.overlapped = False  # Set when another request ran while sampling, so the stacks are not ours alone
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def report(self, top=20) -> str:
+        total = sum(self._stacks.values()) or 1
+        return '\n'.join(
+            f'{count / total:6.1%} {stack}'
+            for stack, count in self._stacks.most_common(top)
+        )
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self._interval_seconds):
+            for thread_id, frame in sys._current_frames().items():
+                # Idle pool threads park in threading.py and would drown out the useful stacks
+                if thread_id != own_id and not frame.f_code.co_filename.endswith('threading.py'):
+                    self._stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        stack = []
+        while frame is not None:
+            stack.append(f'{frame.f_code.co_filename}:{frame.f_code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
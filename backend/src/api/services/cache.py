@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+import time
+
+from api.metrics import record_cache_lookup
+
+# Hits are remembered in memory and written back in batches instead of an UPDATE per hit
+_TOUCH_BATCH_SIZE = 64
+# Eviction trims down to this fraction of max_entries so it runs once per batch of inserts, not on every one
+_EVICTION_LOW_WATERMARK = 0.9
+
+
+class SharedCache:
+    def __init__(self, path: str, name: str, max_entries: int):
+        self._name = name
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._touched: dict[str, float] = {}
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" (key TEXT PRIMARY KEY, value BLOB NOT NULL, used_at REAL NOT NULL)'
+        )
+        self._connection.execute(f'CREATE INDEX IF NOT EXISTS "{name}_used_at" ON "{name}" (used_at)')
+        # Other workers insert into the same table, so this is only an estimate that gets corrected on eviction
+        self._estimated_entries = self._count()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._connection.execute(f'SELECT value FROM "{self._name}" WHERE key = ?', (key,)).fetchone()
+            if row:
+                self._touched[key] = time.time()
+                if len(self._touched) >= _TOUCH_BATCH_SIZE:
+                    self._flush_touches()
+        record_cache_lookup(self._name, row is not None)
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes):
+        with self._lock:
+            self._connection.execute(
+                f'INSERT OR REPLACE INTO "{self._name}" (key, value, used_at) VALUES (?, ?, ?)',
+                (key, value, time.time())
+            )
+            self._touched.pop(key, None)
+            self._estimated_entries += 1
+            if self._estimated_entries > self._max_entries:
+                self._evict()
+
+    def _flush_touches(self):
+        self._connection.executemany(
+            f'UPDATE "{self._name}" SET used_at = ? WHERE key = ?',
+            [(used_at, key) for key, used_at in self._touched.items()]
+        )
+        self._touched.clear()
+
+    def _evict(self):
+        self._flush_touches()
+        if self._count() > self._max_entries:
+            self._connection.execute(
+                f'DELETE FROM "{self._name}" WHERE key IN '
+                f'(SELECT key FROM "{self._name}" ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                (int(self._max_entries * _EVICTION_LOW_WATERMARK),)
+            )
+        self._estimated_entries = self._count()
+
+    def _count(self) -> int:
+        return self._connection.execute(f'SELECT count(*) FROM "{self._name}"').fetchone()[0]
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from api.metrics import record_cache_lookup
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self._name = name
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        record_cache_lookup(self._name, task is not None)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shielded so that one caller giving up does not cancel the work for everyone else awaiting it
+            return await asyncio.shield(task)
+        finally:
+            # The last caller to give up takes the work down with it, nobody is left to use the result
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+                    if self._in_flight.get(key) is task:
+                        del self._in_flight[key]  # A caller arriving now starts afresh instead of joining a cancelled task
+
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # Marks the exception as retrieved even if every caller has gone away
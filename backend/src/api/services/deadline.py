@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Deadline:
+    expires_at: float  # time.monotonic() based
+
+    @staticmethod
+    def after(seconds: float) -> 'Deadline':
+        return Deadline(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+# Timeout for the next call made under the deadline. An expired deadline raises instead of returning 0,
+# which Neo4j would take as no timeout at all.
+def remaining(deadline: Deadline | None) -> float | None:
+    if deadline is None:
+        return None
+    if (seconds := deadline.remaining()) <= 0:
+        raise TimeoutError('Request deadline exceeded')
+    return seconds
+
+
+# Like asyncio.gather, but an awaitable that fails or is still running at the deadline comes back as None
+# instead of taking the finished results down with it. Unfinished ones are cancelled.
+async def gather_until(deadline: Deadline | None, *aws: Awaitable) -> list:
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    if not tasks:
+        return []
+
+    try:
+        await asyncio.wait(tasks, timeout=deadline.remaining() if deadline else None)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return [_result_or_none(task) for task in tasks]
+
+
+def _result_or_none(task: asyncio.Task):
+    if not task.done() or task.cancelled():
+        return None
+    if (e := task.exception()) is not None:
+        logger.warning(f'Leaving out a result that failed: {e!r}', exc_info=e)
+        return None
+    return task.result()
@@ -1,5 +1,10 @@
-from neo4j import GraphDatabase
+import json
+from concurrent.futures import ThreadPoolExecutor
 
+from neo4j import GraphDatabase, Query
+from neo4j.exceptions import ClientError
+
+from api.metrics import track_neo4j_query
 from api.models import Theme, Recap
 
 
@@ -14,12 +19,21 @@ class GraphService:
         if not self._driver:
             self._driver = GraphDatabase.driver(self._uri, auth=(self._username, self._password))
 
+    def warm_up(self, connections: int):
+        self._driver.verify_connectivity()
+        # Concurrent queries force the driver to open that many pooled connections
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            list(pool.map(lambda _: self._driver.execute_query('RETURN 1', database_="neo4j"), range(connections)))
+
     def close(self):
         if self._driver:
             self._driver.close()
             self._driver = None
 
-    def find_similar_themes(self, vector: list[float], k=5) -> list[(Theme, float)]:
+    def find_similar_themes(self, vector: list[float], k=5, timeout: float | None = None) -> list[(Theme, float)]:
+        # A timeout of 0 means unbounded to Neo4j
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError('No time left for the Neo4j query')
         with self._driver.session():
             cypher = f'''
             CALL db.index.vector.queryNodes("theme_index", {k}, {vector})
@@ -45,11 +59,17 @@ class GraphService:
                     title=d['title'],
                     description=d['description'],
                     explanation=d['explanation'],
-                    supporting_quotes=d['supporting_quotes'].split(';'),
+                    supporting_quotes=d['supporting_quotes'],
                     recap='\n'.join(r['text'] for r in sorted(d['recap_parts'], key=lambda x: x['index']))
                 ), d['score']
 
-            records, _, _ = self._driver.execute_query(query_=cypher, database_="neo4j")
+            with track_neo4j_query('find_similar_themes'):
+                try:
+                    records, _, _ = self._driver.execute_query(query_=Query(cypher, timeout=timeout), database_="neo4j")
+                except ClientError as e:
+                    if e.code and e.code.startswith('Neo.ClientError.Transaction.TransactionTimedOut'):
+                        raise TimeoutError(f'Neo4j query exceeded its {timeout}s timeout') from e
+                    raise
             return [to_theme_with_score(r.data()) for r in records]
 
     def find_recap_by_theme_id(self, theme_semantic_id: str) -> Recap:
@@ -60,9 +80,67 @@ class GraphService:
             ORDER BY r.index
             '''
 
-            records, _, _ = self._driver.execute_query(query_=cypher, database_="neo4j")
+            with track_neo4j_query('find_recap_by_theme_id'):
+                records, _, _ = self._driver.execute_query(query_=cypher, database_="neo4j")
             results = [r.data() for r in records]
             return Recap(
                 episode_title=results[0]['episode_title'],
                 parts=[r['text'] for r in results]
             )
+
+    def fingerprint(self) -> str:
+        cypher = '''
+        OPTIONAL MATCH (l:GraphLoad)
+        WITH max(l.id) AS load_id
+        OPTIONAL MATCH (t:Theme)
+        RETURN load_id, count(t) AS themes, max(t.id) AS max_theme_id
+        '''
+
+        with track_neo4j_query('fingerprint'):
+            records, _, _ = self._driver.execute_query(query_=cypher, database_="neo4j")
+        return json.dumps(records[0].data(), sort_keys=True)
+
+    def export_episodes(self) -> list[dict]:
+        cypher = '''
+        MATCH (e:Episode)
+        OPTIONAL MATCH (e)-[:HAS_RECAP_PART]->(r:RecapPart)
+        WITH e, r ORDER BY r.index
+        RETURN e.id AS id, e.title AS title, e.wiki_url AS wiki_url, collect(r { .text, .embedding }) AS recap_parts
+        ORDER BY id
+        '''
+
+        with track_neo4j_query('export_episodes'):
+            records, _, _ = self._driver.execute_query(query_=cypher, database_="neo4j")
+        return [r.data() for r in records]
+
+    def export_characters(self) -> list[dict]:
+        cypher = '''
+        MATCH (c:Character)
+        OPTIONAL MATCH (c)-[:APPEARS_IN]->(e:Episode)
+        WITH c, e ORDER BY e.id
+        RETURN c.id AS id, c.name AS name, collect(DISTINCT e.id) AS episode_ids
+        ORDER BY id
+        '''
+
+        with track_neo4j_query('export_characters'):
+            records, _, _ = self._driver.execute_query(query_=cypher, database_="neo4j")
+        return [r.data() for r in records]
+
+    def export_themes(self) -> list[dict]:
+        cypher = '''
+        MATCH (e:Episode)-[:HAS_THEME]->(t:Theme)
+        WHERE t.embedding IS NOT NULL
+        RETURN
+            t.id AS semantic_id,
+            e.id AS episode_id,
+            t.title AS title,
+            t.description AS description,
+            t.explanation AS explanation,
+            t.supporting_quotes AS supporting_quotes,
+            t.embedding AS embedding
+        ORDER BY semantic_id
+        '''
+
+        with track_neo4j_query('export_themes'):
+            records, _, _ = self._driver.execute_query(query_=cypher, database_="neo4j")
+        return [r.data() for r in records]
@@ -0,0 +1,117 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from api.services.store import ThemeStore
+
+_WORD_PATTERN = re.compile(r'[a-z]+')
+_VOWEL_PATTERN = re.compile(r'[aeiouy]')
+
+_STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'between', 'by', 'for', 'from', 'how', 'in', 'is', 'it', 'its',
+    'of', 'on', 'or', 'that', 'the', 'their', 'them', 'this', 'to', 'with', 'your', 'you', 'our', 'we'
+}
+
+_FIELD_WEIGHTS = {
+    'title': 3,
+    'description': 2,
+    'explanation': 1,
+    'supporting_quotes': 1,
+}
+
+
+def tokenize(text: str) -> list[str]:
+    return [stem(w) for w in _WORD_PATTERN.findall(text.lower()) if w not in _STOP_WORDS]
+
+
+def stem(word: str) -> str:
+    # Light suffix stripping that takes every form of a word to the same stem, e.g. share, shares and sharing all
+    # become "shar" and sibling and siblings both become "sibl". The stems are not words, they only have to agree.
+    if len(word) > 4 and word.endswith('ies'):
+        word = word[:-3] + 'y'
+    elif len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+
+    if word.endswith('eed') and len(word) > 4:
+        word = word[:-1]  # agreed -> agree, but need stays need
+    for suffix in ('ing', 'ed'):
+        base = word[:-len(suffix)]
+        # "bring" and "red" have no vowel left without the suffix, and the "ed" of "need" is part of the word
+        if word.endswith(suffix) and len(base) > 1 and _VOWEL_PATTERN.search(base) and not word.endswith('eed'):
+            word = base
+            if len(word) > 2 and word[-1] == word[-2] and word[-1] not in 'aeioulsz':
+                word = word[:-1]  # running -> run, but falling -> fall
+            break
+
+    return word[:-1] if len(word) > 2 and word.endswith('e') else word
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k=60) -> list[int]:
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] += 1 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    def __init__(self, k1=1.2, b=0.75):
+        self._k1 = k1
+        self._b = b
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: dict[str, float] = {}
+        self._length_norms: np.ndarray | None = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._length_norms is not None
+
+    def build(self, theme_store: ThemeStore):
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+        for i in range(len(theme_store)):
+            theme = theme_store.get_theme(i)
+            term_frequencies = Counter()
+            for field, weight in _FIELD_WEIGHTS.items():
+                value = getattr(theme, field)
+                for token in tokenize(' '.join(value) if isinstance(value, list) else value):
+                    term_frequencies[token] += weight
+
+            for token, frequency in term_frequencies.items():
+                postings[token][0].append(i)
+                postings[token][1].append(frequency)
+            lengths.append(sum(term_frequencies.values()))
+
+        n = len(lengths)
+        lengths = np.array(lengths, dtype=np.float32)
+        self._postings = {
+            token: (np.array(docs, dtype=np.int32), np.array(frequencies, dtype=np.float32))
+            for token, (docs, frequencies) in postings.items()
+        }
+        self._idf = {
+            token: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, (docs, _) in postings.items()
+        }
+        self._length_norms = self._k1 * (1 - self._b + self._b * lengths / lengths.mean())
+
+    def search(self, query: str, limit=50, mask: np.ndarray | None = None) -> list[(int, float)]:
+        scores = np.zeros(len(self._length_norms), dtype=np.float32)
+        for token in set(tokenize(query)):
+            if token not in self._postings:
+                continue
+            docs, frequencies = self._postings[token]
+            scores[docs] += self._idf[token] * frequencies * (self._k1 + 1) / (frequencies + self._length_norms[docs])
+        if mask is not None:
+            scores[~mask] = 0
+
+        matched = np.flatnonzero(scores)
+        top = matched[np.argsort(-scores[matched])][:limit]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def covers(self, query: str, doc: int) -> bool:
+        return all(
+            token in self._postings and doc in self._postings[token][0]
+            for token in set(tokenize(query))
+        )
@@ -1,22 +1,77 @@
-from openai import OpenAI, NOT_GIVEN
+import asyncio
+from array import array
+from typing import Awaitable, Callable
+
+from openai import AsyncOpenAI, NOT_GIVEN
+
+from api.metrics import track_llm_call, record_llm_hedge, record_llm_usage
+from api.services.cache import SharedCache
+
+_EMBEDDING_MODEL = "text-embedding-ada-002"
+_COMPLETION_MODEL = "gpt-4o-mini"
 
 
 class LlmService:
-    def __init__(self):
-        self._client = OpenAI()
+    def __init__(self, embedding_cache: SharedCache | None = None, hedge_after_seconds: float | None = None):
+        self._client = AsyncOpenAI()
+        self._embedding_cache = embedding_cache
+        self._hedge_after_seconds = hedge_after_seconds
 
-    def create_embedding(self, text: str) -> list[float]:
+    async def create_embedding(self, text: str, use_cache=True) -> list[float]:
         text = text.replace("\n", " ")
-        results = self._client.embeddings.create(input=[text], model="text-embedding-ada-002")
-        return results.data[0].embedding
-
-    def query_gpt4o_mini(self, prompt: str, requires_json_answer=True) -> str:
-        completion = self._client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0,
-            response_format={"type": "json_object"} if requires_json_answer else NOT_GIVEN,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        embedding_cache = self._embedding_cache if use_cache else None
+        if embedding_cache and (cached := await asyncio.to_thread(embedding_cache.get, text)):
+            embedding = array('f')
+            embedding.frombytes(cached)
+            return embedding.tolist()
+
+        with track_llm_call(_EMBEDDING_MODEL, 'embedding'):
+            results = await self._client.embeddings.create(input=[text], model=_EMBEDDING_MODEL)
+        record_llm_usage(_EMBEDDING_MODEL, 'embedding', results.usage)
+
+        embedding = results.data[0].embedding
+        if embedding_cache:
+            await asyncio.to_thread(embedding_cache.set, text, array('f', embedding).tobytes())
+        return embedding
+
+    async def query_gpt4o_mini(self, prompt: str, requires_json_answer=True, operation='completion') -> str:
+        if not self._hedge_after_seconds:
+            return await self._complete(prompt, requires_json_answer, operation)
+        return await self._hedged(lambda: self._complete(prompt, requires_json_answer, operation), operation)
+
+    async def _complete(self, prompt: str, requires_json_answer: bool, operation: str) -> str:
+        with track_llm_call(_COMPLETION_MODEL, operation):
+            completion = await self._client.chat.completions.create(
+                model=_COMPLETION_MODEL,
+                temperature=0,
+                response_format={"type": "json_object"} if requires_json_answer else NOT_GIVEN,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            )
+        record_llm_usage(_COMPLETION_MODEL, operation, completion.usage)
         return completion.choices[0].message.content
+
+    async def _hedged(self, call: Callable[[], Awaitable[str]], operation: str) -> str:
+        # A straggling completion gets a duplicate request and whichever answers first wins
+        original = asyncio.ensure_future(call())
+        tasks = [original]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_after_seconds)
+            if not done:
+                tasks.append(asyncio.ensure_future(call()))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            record_llm_hedge(_COMPLETION_MODEL, operation, hedge_won=task is not original)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
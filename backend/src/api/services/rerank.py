@@ -0,0 +1,35 @@
+from api.models import Theme
+from api.services.lexical import tokenize
+
+_FIELD_WEIGHTS = {
+    'title': 1.0,
+    'description': 0.6,
+    'explanation': 0.3,
+}
+
+
+class LocalReranker:
+    def __init__(self, lexical_weight=0.2, margin=0.02):
+        self._lexical_weight = lexical_weight
+        self._margin = margin
+
+    def best_match_ids(self, theme: str, candidates: list[(Theme, float)]) -> list[str]:
+        if not candidates:
+            return []
+
+        query_tokens = set(tokenize(theme))
+        scores = {
+            t.semantic_id: score + self._lexical_weight * self._lexical_overlap(query_tokens, t)
+            for t, score in candidates
+        }
+        best = max(scores.values())
+        return [semantic_id for semantic_id, score in scores.items() if score >= best - self._margin]
+
+    @staticmethod
+    def _lexical_overlap(query_tokens: set[str], theme: Theme) -> float:
+        if not query_tokens:
+            return 0.0
+        return sum(
+            weight * len(query_tokens & set(tokenize(getattr(theme, field)))) / len(query_tokens)
+            for field, weight in _FIELD_WEIGHTS.items()
+        )
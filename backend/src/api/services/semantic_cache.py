@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from api.metrics import record_cache_lookup, record_semantic_cache_verification
+from api.models import SimilarThemes
+
+
+class SemanticCache:
+    def __init__(self, threshold: float, max_entries: int):
+        self._threshold = threshold
+        self._max_entries = max_entries
+        self._embeddings: np.ndarray | None = None
+        self._ks = np.zeros(max_entries, dtype=np.int32)  # 0 marks a free slot
+        self._responses: OrderedDict[int, SimilarThemes] = OrderedDict()  # slot -> response, least recent first
+        self._version: str | None = None  # Theme store version the cached responses were built from
+
+    def get(self, embedding: list[float], k: int, version: str | None) -> SimilarThemes | None:
+        self._check_version(version)
+        slot = self._find(embedding, k)
+        record_cache_lookup('semantic', slot is not None)
+        if slot is None:
+            return None
+
+        self._responses.move_to_end(slot)
+        return self._responses[slot]
+
+    def put(self, embedding: list[float], k: int, version: str | None, response: SimilarThemes):
+        self._check_version(version)
+        if self._embeddings is None:
+            self._embeddings = np.zeros((self._max_entries, len(embedding)), dtype=np.float32)
+
+        if len(self._responses) < self._max_entries:
+            slot = len(self._responses)
+        else:
+            slot, _ = self._responses.popitem(last=False)
+
+        self._embeddings[slot] = self._normalize(embedding)
+        self._ks[slot] = k
+        self._responses[slot] = response
+
+    def _check_version(self, version: str | None):
+        # Responses refer to themes of one snapshot, once the store is rebuilt they all go
+        if version != self._version:
+            self._responses.clear()
+            self._ks[:] = 0
+            self._version = version
+
+    @staticmethod
+    def record_verification(is_false_hit: bool):
+        record_semantic_cache_verification(is_false_hit)
+
+    def _find(self, embedding: list[float], k: int) -> int | None:
+        if not self._responses:
+            return None
+
+        scores = self._embeddings @ self._normalize(embedding)
+        scores[self._ks != k] = -np.inf
+        slot = int(np.argmax(scores))
+        return slot if scores[slot] >= self._threshold else None
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
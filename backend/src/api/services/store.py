@@ -0,0 +1,234 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from urllib.parse import unquote
+
+import numpy as np
+
+from api.models import Character, Theme, ThemeResponse
+from api.services.graph import GraphService
+
+_SNAPSHOT = 'snapshot-v3'  # Bumped whenever the file layout changes so stale snapshots are not mapped
+
+
+def top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+class ThemeStore:
+    def __init__(self, directory: str):
+        self._directory = directory
+        self.version: str | None = None
+        self._themes: list[dict] = []
+        self._episodes: list[dict] = []
+        self._theme_indices: dict[str, int] = {}
+        self._characters: list[Character] = []
+        self._character_indices: dict[str, int] = {}
+        self._character_theme_mask: np.ndarray | None = None
+        self._embeddings: np.ndarray | None = None
+        self._recap_parts: mmap.mmap | None = None
+        self._recap_part_offsets: np.ndarray | None = None
+        self._episode_part_offsets: np.ndarray | None = None
+        self._recap_part_embeddings: np.ndarray | None = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._embeddings is not None
+
+    def load(self, graph_service: GraphService):
+        os.makedirs(self._directory, exist_ok=True)
+        # Snapshots are named after the graph they were built from, so reloading the graph leads to a new one
+        fingerprint = graph_service.fingerprint()
+        snapshot_name = f'{_SNAPSHOT}-{hashlib.sha256(fingerprint.encode()).hexdigest()[:16]}'
+        snapshot_dir = os.path.join(self._directory, snapshot_name)
+        # The first worker builds the snapshot, the others wait for it and then map the same files,
+        # so the embedding matrix and recaps live once in the page cache instead of once per worker
+        with open(os.path.join(self._directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(snapshot_dir):
+                self._build(graph_service, snapshot_dir, fingerprint)
+                self._remove_other_snapshots(snapshot_name)
+        self._map(snapshot_dir)
+
+    def __len__(self) -> int:
+        return len(self._themes)
+
+    @property
+    def characters(self) -> list[Character]:
+        return self._characters
+
+    def get_character(self, character_id: str) -> Character | None:
+        i = self._character_indices.get(unquote(character_id))
+        return None if i is None else self._characters[i]
+
+    def character_theme_mask(self, character_id: str) -> np.ndarray:
+        return self._character_theme_mask[self._character_indices[unquote(character_id)]]
+
+    def themes_with_character(self, character_id: str) -> list[ThemeResponse]:
+        return [self._get_theme_response(i) for i in np.flatnonzero(self.character_theme_mask(character_id))]
+
+    def find_similar_themes(self, vector: list[float], k=5, mask: np.ndarray | None = None) -> list[(Theme, float)]:
+        scores = self.score_themes(vector)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        return [(self.get_theme(i), float(scores[i])) for i in top_indices(scores, k) if mask is None or mask[i]]
+
+    def score_themes(self, vector: list[float]) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32)
+        return self._embeddings @ (query / np.linalg.norm(query))
+
+    def get_theme(self, i: int) -> Theme:
+        t = self._themes[i]
+        episode = self._episodes[t['episode_index']]
+        return Theme(
+            semantic_id=t['semantic_id'],
+            episode_title=episode['title'],
+            episode_url=episode['wiki_url'],
+            title=t['title'],
+            description=t['description'],
+            explanation=t['explanation'],
+            supporting_quotes=t['supporting_quotes'],
+            recap=self._get_recap(t['episode_index'])
+        )
+
+    # Same as get_theme without joining the recap, which listings never show
+    def _get_theme_response(self, i: int) -> ThemeResponse:
+        t = self._themes[i]
+        episode = self._episodes[t['episode_index']]
+        return ThemeResponse(
+            semantic_id=t['semantic_id'],
+            episode_title=episode['title'],
+            episode_url=episode['wiki_url'],
+            title=t['title'],
+            description=t['description'],
+            explanation=t['explanation'],
+            supporting_quotes=t['supporting_quotes']
+        )
+
+    def find_relevant_recap_parts(self, semantic_id: str, vector: list[float], m: int) -> list[str] | None:
+        if self._recap_part_embeddings is None:
+            return None
+
+        episode_index = self._themes[self._theme_indices[semantic_id]]['episode_index']
+        start, end = self._episode_part_offsets[episode_index], self._episode_part_offsets[episode_index + 1]
+        if end - start <= m:
+            return [self._get_recap_part(i) for i in range(start, end)]
+
+        query = np.asarray(vector, dtype=np.float32)
+        scores = self._recap_part_embeddings[start:end] @ (query / np.linalg.norm(query))
+        # Kept in their original order so the excerpt still reads as a story
+        return [self._get_recap_part(start + i) for i in np.sort(top_indices(scores, m))]
+
+    def _get_recap(self, episode_index: int) -> str:
+        start, end = self._episode_part_offsets[episode_index], self._episode_part_offsets[episode_index + 1]
+        return '\n'.join(self._get_recap_part(i) for i in range(start, end))
+
+    def _get_recap_part(self, i: int) -> str:
+        start, end = self._recap_part_offsets[i], self._recap_part_offsets[i + 1]
+        return self._recap_parts[start:end].decode('utf-8')
+
+    def _map(self, snapshot_dir: str):
+        with open(os.path.join(snapshot_dir, 'metadata.json'), encoding='utf-8') as f:
+            metadata = json.load(f)
+        self.version = metadata['version']
+        self._themes = metadata['themes']
+        self._episodes = metadata['episodes']
+        self._theme_indices = {t['semantic_id']: i for i, t in enumerate(self._themes)}
+        self._characters = [Character(**c) for c in metadata['characters']]
+        # Ids come from wiki URLs (Character:Buddy%27s_Mum) but arrive percent-decoded in request paths,
+        # so lookups compare the decoded forms
+        self._character_indices = {unquote(c.id): i for i, c in enumerate(self._characters)}
+        self._character_theme_mask = np.load(os.path.join(snapshot_dir, 'character_theme_mask.npy'), mmap_mode='r')
+        self._recap_part_offsets = np.load(os.path.join(snapshot_dir, 'recap_part_offsets.npy'), mmap_mode='r')
+        self._episode_part_offsets = np.load(os.path.join(snapshot_dir, 'episode_part_offsets.npy'), mmap_mode='r')
+        with open(os.path.join(snapshot_dir, 'recap_parts.bin'), 'rb') as f:
+            self._recap_parts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if os.path.exists(recap_part_embeddings_path := os.path.join(snapshot_dir, 'recap_part_embeddings.npy')):
+            self._recap_part_embeddings = np.load(recap_part_embeddings_path, mmap_mode='r')
+        self._embeddings = np.load(os.path.join(snapshot_dir, 'embeddings.npy'), mmap_mode='r')
+
+    def _remove_other_snapshots(self, snapshot_name: str):
+        # Workers still mapping an old snapshot keep their open files until they reload
+        for name in os.listdir(self._directory):
+            if name.startswith('snapshot') and name != snapshot_name:
+                shutil.rmtree(os.path.join(self._directory, name), ignore_errors=True)
+
+    @staticmethod
+    def _build(graph_service: GraphService, snapshot_dir: str, fingerprint: str):
+        episodes = graph_service.export_episodes()
+        themes = graph_service.export_themes()
+        # Sorted so that the version hash below does not depend on the order Neo4j collected them in
+        characters = sorted(
+            ({**c, 'episode_ids': sorted(c['episode_ids'])} for c in graph_service.export_characters()),
+            key=lambda c: c['id']
+        )
+        episode_indices = {e['id']: i for i, e in enumerate(episodes)}
+
+        # Character -> Episode -> Theme flattened into one row of theme flags per character,
+        # so filtering by character is a mask lookup instead of a traversal
+        theme_episodes = np.array([episode_indices[t['episode_id']] for t in themes])
+        character_theme_mask = np.zeros((len(characters), len(themes)), dtype=bool)
+        for i, c in enumerate(characters):
+            character_theme_mask[i] = np.isin(theme_episodes, [episode_indices[e] for e in c['episode_ids']])
+
+        embeddings = np.array([t['embedding'] for t in themes], dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        parts = [p for e in episodes for p in e['recap_parts']]
+        recap_parts = [p['text'].encode('utf-8') for p in parts]
+        recap_part_offsets = np.cumsum([0] + [len(p) for p in recap_parts], dtype=np.int64)
+        episode_part_offsets = np.cumsum([0] + [len(e['recap_parts']) for e in episodes], dtype=np.int64)
+
+        # Recap parts are only searchable when the ETL embedded all of them, otherwise answers use the full recap
+        recap_part_embeddings = None
+        if parts and all(p.get('embedding') for p in parts):
+            recap_part_embeddings = np.array([p['embedding'] for p in parts], dtype=np.float32)
+            recap_part_embeddings /= np.linalg.norm(recap_part_embeddings, axis=1, keepdims=True)
+
+        version = hashlib.sha256()
+        version.update(embeddings.tobytes())
+        for t in themes:
+            version.update(json.dumps([t['semantic_id'], t['title'], t['description'], t['explanation']]).encode())
+        for p in recap_parts:
+            version.update(p)
+        if recap_part_embeddings is not None:
+            version.update(recap_part_embeddings.tobytes())
+        version.update(json.dumps(characters).encode())
+
+        metadata = {
+            'version': version.hexdigest()[:16],
+            'graph_fingerprint': fingerprint,
+            'episodes': [{'id': e['id'], 'title': e['title'], 'wiki_url': e['wiki_url']} for e in episodes],
+            'characters': [
+                {'id': c['id'], 'name': c['name'], 'episode_count': len(c['episode_ids'])} for c in characters
+            ],
+            'themes': [
+                {
+                    'semantic_id': t['semantic_id'],
+                    'episode_index': episode_indices[t['episode_id']],
+                    'title': t['title'],
+                    'description': t['description'],
+                    'explanation': t['explanation'],
+                    'supporting_quotes': t['supporting_quotes'],
+                }
+                for t in themes
+            ],
+        }
+
+        building_dir = f'{snapshot_dir}.{os.getpid()}'
+        shutil.rmtree(building_dir, ignore_errors=True)
+        os.makedirs(building_dir)
+        np.save(os.path.join(building_dir, 'embeddings.npy'), embeddings)
+        np.save(os.path.join(building_dir, 'character_theme_mask.npy'), character_theme_mask)
+        np.save(os.path.join(building_dir, 'recap_part_offsets.npy'), recap_part_offsets)
+        np.save(os.path.join(building_dir, 'episode_part_offsets.npy'), episode_part_offsets)
+        with open(os.path.join(building_dir, 'recap_parts.bin'), 'wb') as f:
+            f.write(b''.join(recap_parts))
+        if recap_part_embeddings is not None:
+            np.save(os.path.join(building_dir, 'recap_part_embeddings.npy'), recap_part_embeddings)
+        with open(os.path.join(building_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(building_dir, snapshot_dir)
@@ -1,14 +1,29 @@
+import asyncio
 import json
+import random
+from typing import Awaitable, Callable, Literal, get_args
 
-from api.models import SimilarThemes, Theme, SimilarTheme, ThemeResponse
+import numpy as np
+import openai
+
+from api.metrics import record_cache_lookup, track_stage
+from api.models import CharacterThemes, SimilarThemes, Theme, SimilarTheme, ThemeResponse
+from api.services.cache import SharedCache
+from api.services.coalescing import SingleFlight
+from api.services.deadline import Deadline, gather_until, remaining
 from api.services.graph import GraphService
+from api.services.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
 from api.services.llm import LlmService
+from api.services.rerank import LocalReranker
+from api.services.semantic_cache import SemanticCache
+from api.services.store import ThemeStore, top_indices
+from api.services.warehouse import AnswerWarehouse
 
 _REFINE_PROMPT_TEMPLATE = '''
 Below is a short text describing a theme (requested theme) and a list of candidate similar themes.
 Return a list containing the ids of the candidate themes that are most similar to the requested theme.
 Return a json array containing only the ids and nothing else. 
-Here is an example response: {{"ids": ["Theme:Episode:The_Weekend:Emotions"}}
+Here is an example response: {{"ids": ["Theme:Episode:The_Weekend:Emotions"]}}
 
 Requested theme: {requested_theme}
 
@@ -34,48 +49,399 @@ Explanation: {selected_theme_explanation}
 Response with three succinct sentences.
 '''
 
+_COMBINED_THEME_ANSWER_PROMPT = '''
+For each of the candidate texts below, how is the theme "{requested_theme}" expressed in it?
+
+Someone else previously analyzed each text and came up with the theme title, description and explanation
+included with it, which you can use in your answer.
+
+Candidates:
+{candidates}
+
+---
+
+Respond with three succinct sentences per candidate.
+Return a json object mapping each candidate id to its answer and nothing else.
+Here is an example response: {{"answers": {{"Theme:Episode:The_Weekend:Emotions": "..."}}}}
+'''
+
+
+_WARM_UP_THEME = 'Learning to share'
+
+
+BestMatchMode = Literal['llm', 'local', 'off']
+LexicalMode = Literal['off', 'hybrid', 'fast']
+AnswerMode = Literal['parallel', 'combined']
+
+# How many candidates from each ranking take part in the reciprocal rank fusion
+_FUSION_CANDIDATES = 50
+
+
+def normalize_theme(theme: str) -> str:
+    return ' '.join(theme.lower().split())
+
+
+def warehouse_key(theme: str, k: int) -> str:
+    return f'{k}:{normalize_theme(theme)}'
+
+
+def to_theme_response(theme: Theme) -> ThemeResponse:
+    return ThemeResponse(
+        semantic_id=theme.semantic_id,
+        episode_title=theme.episode_title,
+        episode_url=theme.episode_url,
+        title=theme.title,
+        description=theme.description,
+        explanation=theme.explanation,
+        supporting_quotes=theme.supporting_quotes
+    )
+
+
+class ThemeStoreNotLoadedError(Exception):
+    pass
+
 
 class ThemesService:
-    def __init__(self, graph_service: GraphService, llm_service: LlmService):
+    def __init__(
+            self,
+            graph_service: GraphService,
+            llm_service: LlmService,
+            theme_store: ThemeStore,
+            answer_cache: SharedCache | None = None,
+            semantic_cache: SemanticCache | None = None,
+            semantic_cache_verify_rate=0.0,
+            best_match_mode: BestMatchMode = 'llm',
+            lexical_index: LexicalIndex | None = None,
+            lexical_mode: LexicalMode = 'off',
+            lexical_fast_path_min_score=4.0,
+            lexical_fast_path_max_tokens=4,
+            recap_top_parts=0,
+            answer_mode: AnswerMode = 'parallel',
+            answer_warehouse: AnswerWarehouse | None = None
+    ):
+        for name, value, mode in [
+            ('best_match_mode', best_match_mode, BestMatchMode),
+            ('lexical_mode', lexical_mode, LexicalMode),
+            ('answer_mode', answer_mode, AnswerMode),
+        ]:
+            if value not in get_args(mode):
+                raise ValueError(f'Unknown {name} "{value}", expected one of {", ".join(get_args(mode))}')
+
         self._graph_service = graph_service
         self._llm_service = llm_service
+        self._theme_store = theme_store
+        self._answer_cache = answer_cache
+        self._semantic_cache = semantic_cache
+        self._semantic_cache_verify_rate = semantic_cache_verify_rate
+        self._best_match_mode = best_match_mode
+        self._lexical_index = lexical_index
+        self._lexical_mode = lexical_mode
+        self._lexical_fast_path_min_score = lexical_fast_path_min_score
+        self._lexical_fast_path_max_tokens = lexical_fast_path_max_tokens
+        self._recap_top_parts = recap_top_parts
+        self._answer_mode = answer_mode
+        self._answer_warehouse = answer_warehouse
+        self._local_reranker = LocalReranker()
+        self._single_flight = SingleFlight('coalesced_requests')
+        self._background_tasks = set()
+
+    async def find_similar_themes(
+            self,
+            theme: str,
+            k=3,
+            deadline: Deadline | None = None,
+            character_id: str | None = None
+    ) -> SimilarThemes:
+        # Popular themes are answered offline ahead of time, but only while the warehouse matches the loaded data
+        if not character_id and self._answer_warehouse:
+            with track_stage('warehouse_lookup'):
+                precomputed = self._answer_warehouse.get(warehouse_key(theme, k), self._theme_store.version)
+            if precomputed:
+                return precomputed
+
+        return await self._find_similar_themes(theme, k, deadline, character_id)
+
+    def get_character_themes(self, character_id: str) -> CharacterThemes | None:
+        if not (character := self._theme_store.get_character(character_id)):
+            return None
+        return CharacterThemes(
+            character=character,
+            themes=self._theme_store.themes_with_character(character_id)
+        )
 
-    def find_similar_themes(self, theme: str, k=3) -> SimilarThemes:
-        theme_embedding = self._llm_service.create_embedding(theme)
-        similar_themes = self._graph_service.find_similar_themes(theme_embedding, k)
-        return SimilarThemes(self._build_themes_response(theme, similar_themes))
+    async def warm_up(self, k=3):
+        # Skips the shared cache, which other workers have already filled, so this worker opens its own OpenAI connection
+        theme_embedding = await self._llm_service.create_embedding(_WARM_UP_THEME, use_cache=False)
+        await asyncio.to_thread(self._theme_index().find_similar_themes, theme_embedding, k)
+
+    async def get_theme_answer(self, theme: str, similar_theme: Theme, theme_embedding: list[float] | None = None) -> str:
+        text, cache_key = self._get_answer_text(theme, similar_theme, theme_embedding)
+        if (cached := await self._get_cached_answer(cache_key)) is not None:
+            return cached
 
-    def get_theme_answer(self, theme: str, similar_theme: Theme) -> str:
         prompt = _THEME_ANSWER_PROMPT.format(
             requested_theme=theme,
-            text=similar_theme.recap,
+            text=text,
             selected_theme_title=similar_theme.title,
             selected_theme_description=similar_theme.description,
             selected_theme_explanation=similar_theme.explanation
         )
-        return self._llm_service.query_gpt4o_mini(prompt, requires_json_answer=False)
+        answer = await self._llm_service.query_gpt4o_mini(prompt, requires_json_answer=False, operation='answer')
+        await self._cache_answer(cache_key, answer)
+        return answer
+
+    async def _get_cached_answers(
+            self,
+            theme: str,
+            similar_themes: list[Theme],
+            theme_embedding: list[float] | None
+    ) -> (dict[str, str], list[(Theme, str, str)]):
+        answers = {}
+        uncached = []
+        for t in similar_themes:
+            text, cache_key = self._get_answer_text(theme, t, theme_embedding)
+            if (cached := await self._get_cached_answer(cache_key)) is not None:
+                answers[t.semantic_id] = cached
+            else:
+                uncached.append((t, text, cache_key))
+        return answers, uncached
+
+    async def _get_uncached_answers(
+            self,
+            theme: str,
+            uncached: list[(Theme, str, str)],
+            theme_embedding: list[float] | None
+    ) -> dict[str, str]:
+        answers = {}
+        if len(uncached) > 1:
+            try:
+                combined = await self._get_combined_answers(theme, [(t, text) for t, text, _ in uncached])
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError, openai.OpenAIError):
+                combined = {}
+
+            for t, _, cache_key in uncached:
+                if isinstance(answer := combined.get(t.semantic_id), str):
+                    answers[t.semantic_id] = answer
+                    await self._cache_answer(cache_key, answer)
+
+        # Candidates the combined answer left out or garbled, or a lone candidate, get their own call
+        missing = [t for t, _, _ in uncached if t.semantic_id not in answers]
+        fallbacks = await gather_until(None, *(self.get_theme_answer(theme, t, theme_embedding) for t in missing))
+        answers.update({t.semantic_id: answer for t, answer in zip(missing, fallbacks) if answer is not None})
+        return answers
+
+    async def _find_similar_themes(
+            self,
+            theme: str,
+            k: int,
+            deadline: Deadline | None,
+            character_id: str | None
+    ) -> SimilarThemes:
+        # Filtered searches skip the lexical fast path and the semantic cache, neither knows about the filter
+        if self._lexical_mode == 'fast' and self._is_hybrid() and not character_id:
+            with track_stage('lexical_query'):
+                similar_themes = self._find_confident_lexical_matches(theme, k)
+            record_cache_lookup('lexical_fast_path', similar_themes is not None)
+            if similar_themes:
+                with track_stage('answers'):
+                    return SimilarThemes(
+                        await self._build_themes_response(theme, similar_themes, deadline=deadline, match_source='lexical')
+                    )
+
+        with track_stage('embedding'):
+            theme_embedding = await self._coalesced(
+                deadline, ('embedding', normalize_theme(theme)), lambda: self._llm_service.create_embedding(theme)
+            )
+
+        use_semantic_cache = self._semantic_cache is not None and not character_id
+        if use_semantic_cache and (cached := self._semantic_cache.get(theme_embedding, k, self._theme_store.version)):
+            if random.random() < self._semantic_cache_verify_rate:
+                self._run_in_background(self._verify_semantic_cache_hit(theme, theme_embedding, k, cached))
+            return cached
+
+        with track_stage('vector_query'):
+            similar_themes = await asyncio.to_thread(
+                self._search, theme, theme_embedding, k, remaining(deadline), character_id
+            )
+        with track_stage('answers'):
+            response = SimilarThemes(await self._build_themes_response(theme, similar_themes, theme_embedding, deadline))
+
+        # Partial responses are never cached, otherwise one slow request would keep serving missing answers
+        if use_semantic_cache and not any(t.answer_pending for t in response.themes):
+            self._semantic_cache.put(theme_embedding, k, self._theme_store.version, response)
+        return response
+
+    async def _verify_semantic_cache_hit(self, theme: str, theme_embedding: list[float], k: int, cached: SimilarThemes):
+        similar_themes = await asyncio.to_thread(self._search, theme, theme_embedding, k)
+        fresh_ids = {t.semantic_id for t, _ in similar_themes}
+        self._semantic_cache.record_verification(fresh_ids != {t.theme.semantic_id for t in cached.themes})
+
+    # Shared with concurrent callers, each of which only stops waiting at its own deadline
+    async def _coalesced(self, deadline: Deadline | None, key: tuple, fn: Callable[[], Awaitable]):
+        async with asyncio.timeout(remaining(deadline)):
+            return await self._single_flight.do(key, fn)
+
+    def _run_in_background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _theme_index(self) -> ThemeStore | GraphService:
+        return self._theme_store if self._theme_store.is_loaded else self._graph_service
+
+    def _get_answer_text(self, theme: str, similar_theme: Theme, theme_embedding: list[float] | None) -> (str, str):
+        recap_parts = self._find_relevant_recap_parts(similar_theme, theme_embedding)
+        excerpt = 'full' if recap_parts is None else f'top{self._recap_top_parts}'
+        cache_key = f'{self._theme_store.version}:{similar_theme.semantic_id}:{excerpt}:{normalize_theme(theme)}'
+        return similar_theme.recap if recap_parts is None else '\n'.join(recap_parts), cache_key
+
+    # SQLite calls can wait on another worker's write lock, so they run off the event loop
+    async def _get_cached_answer(self, cache_key: str) -> str | None:
+        if self._answer_cache and (cached := await asyncio.to_thread(self._answer_cache.get, cache_key)):
+            return cached.decode('utf-8')
+        return None
+
+    async def _cache_answer(self, cache_key: str, answer: str):
+        if self._answer_cache:
+            await asyncio.to_thread(self._answer_cache.set, cache_key, answer.encode('utf-8'))
+
+    async def _get_combined_answers(self, theme: str, candidates: list[(Theme, str)]) -> dict[str, str]:
+        candidates_json = json.dumps([
+            {
+                'id': t.semantic_id,
+                'title': t.title,
+                'description': t.description,
+                'explanation': t.explanation,
+                'text': text
+            }
+            for t, text in candidates
+        ])
+        prompt = _COMBINED_THEME_ANSWER_PROMPT.format(requested_theme=theme, candidates=candidates_json)
+        answer = json.loads(await self._llm_service.query_gpt4o_mini(prompt, operation='combined_answer'))
+        return dict(answer['answers'])
+
+    def _find_relevant_recap_parts(self, similar_theme: Theme, theme_embedding: list[float] | None) -> list[str] | None:
+        if self._recap_top_parts <= 0 or theme_embedding is None or not self._theme_store.is_loaded:
+            return None
+        return self._theme_store.find_relevant_recap_parts(similar_theme.semantic_id, theme_embedding, self._recap_top_parts)
+
+    def _is_hybrid(self) -> bool:
+        return self._lexical_mode != 'off' and self._lexical_index is not None and self._lexical_index.is_loaded
+
+    def _search(
+            self,
+            theme: str,
+            theme_embedding: list[float],
+            k: int,
+            timeout: float | None = None,
+            character_id: str | None = None
+    ) -> list[(Theme, float)]:
+        if not self._theme_store.is_loaded:
+            if character_id:
+                raise ThemeStoreNotLoadedError('Filtering by character needs the theme store')
+            return self._graph_service.find_similar_themes(theme_embedding, k, timeout)
+
+        mask = self._theme_store.character_theme_mask(character_id) if character_id else None
+        if not self._is_hybrid():
+            return self._theme_store.find_similar_themes(theme_embedding, k, mask)
+
+        # Exact keyword matches (names, places, games) that the embedding blurs get pulled up by the lexical ranking,
+        # while the reported score stays the cosine similarity so it means the same thing as before
+        vector_scores = self._theme_store.score_themes(theme_embedding)
+        candidate_scores = vector_scores if mask is None else np.where(mask, vector_scores, -np.inf)
+        vector_ranking = [int(i) for i in top_indices(candidate_scores, _FUSION_CANDIDATES) if mask is None or mask[i]]
+        lexical_ranking = [i for i, _ in self._lexical_index.search(theme, _FUSION_CANDIDATES, mask)]
+        top = reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:k]
+        return [(self._theme_store.get_theme(i), float(vector_scores[i])) for i in top]
+
+    def _find_confident_lexical_matches(self, theme: str, k: int) -> list[(Theme, float)] | None:
+        if len(tokenize(theme)) > self._lexical_fast_path_max_tokens:
+            return None
+
+        # Too few keyword matches to fill the response, the vector search finds the rest
+        matches = self._lexical_index.search(theme, k)
+        if len(matches) < k:
+            return None
+        best, best_score = matches[0]
+        if best_score < self._lexical_fast_path_min_score or not self._lexical_index.covers(theme, best):
+            return None
+
+        return [(self._theme_store.get_theme(i), score) for i, score in matches]
+
+    async def _build_themes_response(
+            self,
+            theme: str,
+            similar_themes: list[(Theme, float)],
+            theme_embedding: list[float] | None = None,
+            deadline: Deadline | None = None,
+            match_source='vector'
+    ) -> list[SimilarTheme]:
+        # The refine call runs alongside the answers so marking best matches adds no latency of its own.
+        # The calls are shared with concurrent requests for the same theme and run without a deadline of their own,
+        # whatever this request is still waiting for at its deadline is left out and the response goes out without it.
+        # A call is cancelled once no request is waiting for it anymore.
+        themes = [t for t, _ in similar_themes]
+        theme_key = normalize_theme(theme)
+        theme_ids = [t.semantic_id for t in themes]
+        if self._answer_mode == 'combined':
+            # Cached answers are looked up first, so they are not lost if the combined call runs out of time
+            answers, uncached = await self._get_cached_answers(theme, themes, theme_embedding)
+            best_match_themes, uncached_answers = await gather_until(
+                deadline,
+                self._single_flight.do(
+                    ('best_match', theme_key, *theme_ids),
+                    lambda: self._get_best_match_theme_ids(theme, similar_themes)
+                ),
+                self._single_flight.do(
+                    ('combined_answers', theme_key, theme_embedding is None, *(t.semantic_id for t, _, _ in uncached)),
+                    lambda: self._get_uncached_answers(theme, uncached, theme_embedding)
+                )
+            )
+            answers.update(uncached_answers or {})
+            answers = [answers.get(t.semantic_id) for t in themes]
+        else:
+            best_match_themes, *answers = await gather_until(
+                deadline,
+                self._single_flight.do(
+                    ('best_match', theme_key, *theme_ids),
+                    lambda: self._get_best_match_theme_ids(theme, similar_themes)
+                ),
+                *(
+                    self._single_flight.do(
+                        ('answer', theme_key, theme_embedding is None, t.semantic_id),
+                        lambda t=t: self.get_theme_answer(theme, t, theme_embedding)
+                    )
+                    for t in themes
+                )
+            )
+        best_match_themes = best_match_themes or []
 
-    def _build_themes_response(self, theme: str, similar_themes: list[(Theme, float)], mark_best_matches=False) -> list[SimilarTheme]:
-        best_match_themes = self._get_best_match_theme_id(theme, [t for t, _ in similar_themes]) if mark_best_matches else [False for t, _ in similar_themes]
         return [
             SimilarTheme(
-                theme=ThemeResponse(
-                    semantic_id=t.semantic_id,
-                    episode_title=t.episode_title,
-                    episode_url=t.episode_url,
-                    title=t.title,
-                    description=t.description,
-                    explanation=t.explanation,
-                    supporting_quotes=t.supporting_quotes
-                ),
-                score=s,
+                theme=to_theme_response(t),
+                score=None if match_source == 'lexical' else s,
                 is_best_match=t.semantic_id in best_match_themes,
-                answer=self.get_theme_answer(theme, t)
+                answer=answer,
+                answer_pending=answer is None,
+                match_source=match_source,
+                lexical_score=s if match_source == 'lexical' else None
             )
-            for t, s in similar_themes
+            for (t, s), answer in zip(similar_themes, answers)
         ]
 
-    def _get_best_match_theme_id(self, theme: str, similar_themes: list[Theme]) -> list[str]:
+    async def _get_best_match_theme_ids(self, theme: str, similar_themes: list[(Theme, float)]) -> list[str]:
+        match self._best_match_mode:
+            case 'llm':
+                try:
+                    return await self._get_best_match_theme_ids_from_llm(theme, [t for t, _ in similar_themes])
+                except (json.JSONDecodeError, KeyError, TypeError, openai.OpenAIError):
+                    return []
+            case 'local':
+                return self._local_reranker.best_match_ids(theme, similar_themes)
+            case 'off':
+                return []
+
+    async def _get_best_match_theme_ids_from_llm(self, theme: str, similar_themes: list[Theme]) -> list[str]:
         candidates_json = json.dumps([
             {
                 'id': t.semantic_id,
@@ -86,5 +452,5 @@ class ThemesService:
             for t in similar_themes
         ])
         prompt = _REFINE_PROMPT_TEMPLATE.format(requested_theme=theme, candidate_themes=candidates_json)
-        answer = json.loads(self._llm_service.query_gpt4o_mini(prompt))
+        answer = json.loads(await self._llm_service.query_gpt4o_mini(prompt, operation='refine'))
         return answer['ids']
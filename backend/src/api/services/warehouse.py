@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import asdict
+from typing import Iterable
+
+from api.metrics import record_cache_lookup
+from api.models import SimilarTheme, SimilarThemes, ThemeResponse
+
+logger = logging.getLogger(__name__)
+
+
+# How often lookups check whether the warehouse file was rebuilt or removed
+_RECHECK_SECONDS = 5.0
+
+
+class AnswerWarehouse:
+    # The file may be missing at startup or swapped in by a rebuild while the API runs, so it is reopened whenever
+    # its inode or mtime changes. A warehouse built under a different config than the one given is never served.
+    def __init__(self, path: str, config: dict[str, str]):
+        self._path = path
+        self._config = config
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._file_id: tuple[int, int] | None = None
+        self._checked_at = 0.0
+        self.metadata: dict[str, str] = {}
+        self.version: str | None = None
+        self._reopen_if_changed()
+
+    def get(self, key: str, version: str) -> SimilarThemes | None:
+        if time.monotonic() - self._checked_at >= _RECHECK_SECONDS:
+            self._reopen_if_changed()
+        with self._lock:
+            if self._connection is None or self.version != version:
+                return None
+            row = self._connection.execute('SELECT payload FROM responses WHERE key = ?', (key,)).fetchone()
+        record_cache_lookup('warehouse', row is not None)
+        return _decode(row[0]) if row else None
+
+    def _reopen_if_changed(self):
+        try:
+            stat = os.stat(self._path)
+            file_id = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            file_id = None
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if file_id == self._file_id:
+                return
+            if self._connection:
+                self._connection.close()
+            self._connection, self.metadata, self.version = None, {}, None
+            self._file_id = file_id
+            if file_id is None:
+                return
+
+            connection = sqlite3.connect(f'file:{self._path}?mode=ro', uri=True, check_same_thread=False)
+            self.metadata = dict(connection.execute('SELECT name, value FROM metadata').fetchall())
+            self.version = self.metadata['version']
+            mismatched = {
+                name: self.metadata.get(name) for name, value in self._config.items() if self.metadata.get(name) != value
+            }
+            if mismatched:
+                connection.close()
+            else:
+                self._connection = connection
+
+        if mismatched:
+            logger.warning(f'Not serving precomputed answers from {self._path}, it was built with {mismatched} '
+                           f'but the API runs with {self._config}')
+        else:
+            logger.info(f'Serving precomputed answers from {self._path} (version {self.version})')
+
+    @staticmethod
+    def write(path: str, version: str, metadata: dict[str, str], responses: Iterable[tuple[str, SimilarThemes]]):
+        # Written next to the target and swapped in, so a running API never sees a half written warehouse
+        building_path = f'{path}.{os.getpid()}'
+        if os.path.exists(building_path):
+            os.remove(building_path)
+
+        with sqlite3.connect(building_path) as connection:
+            connection.execute('CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            connection.execute('CREATE TABLE responses (key TEXT PRIMARY KEY, payload BLOB NOT NULL) WITHOUT ROWID')
+            connection.executemany(
+                'INSERT INTO metadata (name, value) VALUES (?, ?)',
+                [('version', version), *metadata.items()]
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO responses (key, payload) VALUES (?, ?)',
+                ((key, _encode(response)) for key, response in responses)
+            )
+        connection.close()
+        os.replace(building_path, path)
+
+
+def _encode(response: SimilarThemes) -> bytes:
+    return zlib.compress(json.dumps(asdict(response), separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(payload: bytes) -> SimilarThemes:
+    data = json.loads(zlib.decompress(payload))
+    return SimilarThemes([
+        SimilarTheme(**{**t, 'theme': ThemeResponse(**t['theme'])})
+        for t in data['themes']
+    ])
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import os
+import re
+import sys
+from collections import Counter
+from typing import Iterable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_LOG_REQUEST_PATTERN = re.compile(r'Received request: (.+)$')
+
+
+def read_popular_queries(path: str, from_logs=False, limit: int | None = None) -> list[str]:
+    # Either one query per line, or API logs whose "Received request:" lines are ranked by how often they occur
+    with open(path, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+
+    if not from_logs:
+        return [line for line in lines if line][:limit]
+
+    counts = Counter()
+    originals = {}
+    for line in lines:
+        if match := _LOG_REQUEST_PATTERN.search(line):
+            query = match.group(1).strip()
+            key = ' '.join(query.lower().split())
+            counts[key] += 1
+            originals.setdefault(key, query)
+    return [originals[key] for key, _ in counts.most_common(limit)]
+
+
+async def answer_queries(themes_service, queries: Iterable[str], k: int, concurrency: int) -> dict:
+    from api.services.themes import warehouse_key
+
+    semaphore = asyncio.Semaphore(concurrency)
+    responses = {}
+
+    async def answer(query: str):
+        async with semaphore:
+            try:
+                response = await themes_service.find_similar_themes(query, k)
+            except Exception as e:
+                print(f'Failed to answer "{query}": {e}')
+                return
+        if not any(t.answer_pending for t in response.themes):
+            responses[warehouse_key(query, k)] = response
+            print(f'Answered "{query}" ({len(responses)} done)')
+
+    await asyncio.gather(*(answer(q) for q in queries))
+    return responses
+
+
+async def build_answer_warehouse(queries: list[str], output_path: str, k=3, concurrency=8):
+    # Uses the API's graph, theme store and modes, so the answers match what the API would serve. Everything that could
+    # hand back an earlier answer is left out (the warehouse itself, the shared answer and embedding caches, the semantic
+    # cache and the lexical fast path), so every answer is computed afresh.
+    import api.app as api_app
+    from api.services.llm import LlmService
+    from api.services.themes import ThemesService
+    from api.services.warehouse import AnswerWarehouse
+
+    api_app.themes_service = ThemesService(
+        api_app.graph_service,
+        LlmService(),
+        api_app.theme_store,
+        best_match_mode=api_app.best_match_mode,
+        lexical_index=api_app.lexical_index,
+        lexical_mode='hybrid' if api_app.lexical_mode == 'fast' else api_app.lexical_mode,
+        recap_top_parts=api_app.recap_top_parts,
+        answer_mode=api_app.answer_mode
+    )
+    api_app.graph_service.connect()
+    try:
+        await api_app.warm_up()
+        responses = await answer_queries(api_app.themes_service, queries, k, concurrency)
+    finally:
+        api_app.graph_service.close()
+
+    metadata = {'k': str(k), **api_app.answer_warehouse_config}
+    AnswerWarehouse.write(output_path, api_app.theme_store.version, metadata, responses.items())
+    print(f'Wrote {len(responses)} of {len(queries)} answers to {output_path} (version {api_app.theme_store.version})')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precomputes /themes/find_similar responses for popular queries')
+    parser.add_argument('queries', help='File with one query per line, or API logs with --from-logs')
+    parser.add_argument('--from-logs', action='store_true', help='Rank the queries found in API logs by frequency')
+    parser.add_argument('--limit', type=int, help='Only answer the most popular queries')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--output', default='data/answer_warehouse.sqlite3')
+    args = parser.parse_args()
+
+    popular_queries = read_popular_queries(args.queries, args.from_logs, args.limit)
+    asyncio.run(build_answer_warehouse(popular_queries, os.path.abspath(args.output), args.k, args.concurrency))
@@ -0,0 +1,48 @@
+import csv
+import json
+from typing import Iterable, Iterator
+
+from schema import Schema
+from table import Table
+
+
+def read_csv(path: str, schema: Schema) -> Iterator[dict]:
+    with open(path, mode='r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header != schema.column_names:
+            raise ValueError(f'{path} has header {header}, expected {schema.column_names}')
+
+        for values in reader:
+            yield schema.decode_row(values)
+
+
+def write_csv(path: str, schema: Schema, rows: Iterable[dict]):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(schema.column_names)
+        for row in rows:
+            writer.writerow(schema.encode_row(row))
+
+
+def read_jsonl(path: str, schema: Schema) -> Iterator[dict]:
+    with open(path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            d = json.loads(line)
+            yield {name: d[name] for name in schema.column_names}
+
+
+def write_jsonl(path: str, schema: Schema, rows: Iterable[dict]):
+    with open(path, mode='w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps({name: row[name] for name in schema.column_names}) + '\n')
+
+
+def read_table(path: str, schema: Schema) -> Table:
+    rows = read_jsonl(path, schema) if path.endswith('.jsonl') else read_csv(path, schema)
+    return Table.from_rows(schema, rows)
+
+
+def write_table(path: str, table: Table):
+    write = write_jsonl if path.endswith('.jsonl') else write_csv
+    write(path, table.schema, table.rows())
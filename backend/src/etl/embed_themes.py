@@ -1,36 +1,36 @@
-import csv
+from itertools import batched
+from typing import Callable, Iterable, Iterator
 
 from openai import OpenAI
 
+from codec import read_csv, write_csv
+from schema import RECAP_PARTS, RECAP_PART_EMBEDDINGS, THEMES, THEME_EMBEDDINGS
+
 client = OpenAI()
 
 
-def create_embedding(text: str) -> list[float]:
-    results = client.embeddings.create(input=[text], model="text-embedding-ada-002")
-    return results.data[0].embedding
+def create_embeddings(texts: list[str]) -> list[list[float]]:
+    results = client.embeddings.create(input=texts, model="text-embedding-ada-002")
+    return [d.embedding for d in sorted(results.data, key=lambda d: d.index)]
+
 
+def embed_rows(rows: Iterable[dict], to_text: Callable[[dict], str], batch_size=100) -> Iterator[dict]:
+    for batch in batched(rows, batch_size):
+        for row, embedding in zip(batch, create_embeddings([to_text(row) for row in batch])):
+            yield {'id': row['id'], 'embedding': embedding}
 
-def get_themes() -> dict[str, str]:
-    with open('data/themes.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        return {
-            theme['id']: f'{theme["title"]}\n{theme["description"]}'
-            for theme in reader
-        }
 
+def embed_themes(themes: Iterable[dict], batch_size=100) -> Iterator[dict]:
+    return embed_rows(themes, lambda theme: f'{theme["title"]}\n{theme["description"]}', batch_size)
 
-def save_embeddings(embeddings: dict[str, list[float]]):
-    with open('data/themes_embeddings.csv', 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['id'] + [i for i in range(1536)])
-        for theme_id, embedding in embeddings.items():
-            writer.writerow([theme_id] + embedding)
+
+def embed_recap_parts(recap_parts: Iterable[dict], batch_size=100) -> Iterator[dict]:
+    return embed_rows(recap_parts, lambda part: part['text'], batch_size)
 
 
 if __name__ == '__main__':
-    themes = get_themes()
-    embeddings = {
-        theme_id: create_embedding(theme)
-        for theme_id, theme in themes.items()
-    }
-    save_embeddings(embeddings)
+    embeddings = embed_themes(read_csv('data/themes.csv', THEMES))
+    write_csv('data/themes_embeddings.csv', THEME_EMBEDDINGS, embeddings)
+
+    recap_part_embeddings = embed_recap_parts(read_csv('data/recap_parts.csv', RECAP_PARTS))
+    write_csv('data/recap_parts_embeddings.csv', RECAP_PART_EMBEDDINGS, recap_part_embeddings)
@@ -1,9 +1,11 @@
-import csv
 import re
 
 import requests
 from bs4 import BeautifulSoup, Tag, ResultSet
 
+from codec import write_csv
+from schema import Schema, EPISODES, RECAP_PARTS, EDGES, CHARACTERS, RELATIONS
+
 BASE_URL = 'https://blueypedia.fandom.com'
 
 
@@ -79,7 +81,7 @@ def get_recap(relative_episode_url: str) -> list[str]:
         return []
 
 
-def get_transcripts():
+def get_transcripts(episodes: list[dict]):
     transcripts = [
         {
             'season': e['season'],
@@ -90,7 +92,7 @@ def get_transcripts():
     ]
 
 
-def get_recap_parts():
+def get_recap_parts(episodes: list[dict]) -> list[dict]:
     recaps = [
         {
             'episode_id': e['id'],
@@ -114,12 +116,8 @@ def get_recap_parts():
     return parts
 
 
-def save_csv(filename: str, items: list[dict]):
-    with open(f'data/{filename}.csv', mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=items[0].keys())
-        writer.writeheader()
-        for item in items:
-            writer.writerow(item)
+def save_csv(filename: str, schema: Schema, items: list[dict]):
+    write_csv(f'data/{filename}.csv', schema, items)
 
 
 def remove_parentheses(text):
@@ -145,7 +143,7 @@ def get_appearances_from_wiki(relative_episode_url) -> list[str]:
         return []
 
 
-def get_appearances():
+def get_appearances(episodes: list[dict]) -> list[dict]:
     apperances_in_episodes = [
         {
             'episode_id': e['id'],
@@ -192,7 +190,7 @@ def get_main_characters_biographies():
 
 
 def get_secondary_characters_list() -> dict[str, str]:
-    characters_list_url = 'https://blueypedia.fandom.com/wiki/Category:Secondary_Characters'
+    characters_list_url = f'{BASE_URL}/wiki/Category:Secondary_Characters'
     response = requests.get(characters_list_url)
     soup = BeautifulSoup(response.content, 'html.parser')
     characters = soup.find_all('li', class_='category-page__member')
@@ -217,7 +215,7 @@ def get_secondary_characters_biographies():
     return bios
 
 
-def get_relations():
+def get_relations(characters: list[dict]) -> list[dict]:
     relations = []
     for c in characters:
         relative_url = f'/wiki/{c["id"][len('Character:'):]}'
@@ -335,16 +333,16 @@ def get_characters():
 
 if __name__ == '__main__':
     episodes = get_episodes()
-    save_csv('episodes', episodes)
+    save_csv('episodes', EPISODES, episodes)
 
-    recap_parts = get_recap_parts()
-    save_csv('recap_parts', recap_parts)
+    recap_parts = get_recap_parts(episodes)
+    save_csv('recap_parts', RECAP_PARTS, recap_parts)
 
-    appearances = get_appearances()
-    save_csv('appearances', appearances)
+    appearances = get_appearances(episodes)
+    save_csv('appearances', EDGES, appearances)
 
     characters = get_characters()
-    save_csv('characters', characters)
+    save_csv('characters', CHARACTERS, characters)
 
-    all_relations = get_relations()
-    save_csv('relations', all_relations)
+    all_relations = get_relations(characters)
+    save_csv('relations', RELATIONS, all_relations)
@@ -1,11 +1,13 @@
-import csv
 import json
 from collections import defaultdict
-from typing import Literal
+from typing import Iterable, Iterator, Literal
 
 from openai import OpenAI
 from pydantic import BaseModel
 
+from codec import read_csv
+from schema import RECAP_PARTS
+
 client = OpenAI()
 
 Themes = Literal[
@@ -68,13 +70,11 @@ def build_prompt_v1(recap: str) -> str:
     return prompt_template_v1.format(recap=recap) + enforce_schema_message_v1
 
 
-with open('data/recap_parts.csv', encoding='utf-8', mode='r') as f:
-    reader = csv.DictReader(f)
+def extract_episode_themes(recap_parts: Iterable[dict]) -> Iterator[dict]:
     episode_ids_to_recap_parts = defaultdict(list)
-    for part in reader:
+    for part in recap_parts:
         episode_ids_to_recap_parts[part['episode_id']].append(part['text'])
 
-with open('data/themes.jsonl', mode='a', encoding='utf-8') as f:
     for episode_id, parts in episode_ids_to_recap_parts.items():
         print(episode_id)
         recap = '\n\n'.join(parts)
@@ -82,4 +82,10 @@ with open('data/themes.jsonl', mode='a', encoding='utf-8') as f:
         response = query_gpt4o(prompt_v1)
         d = json.loads(response)
         d['episode_id'] = episode_id
-        f.write(json.dumps(d) + '\n')
+        yield d
+
+
+if __name__ == '__main__':
+    with open('data/themes.jsonl', mode='a', encoding='utf-8') as f:
+        for d in extract_episode_themes(read_csv('data/recap_parts.csv', RECAP_PARTS)):
+            f.write(json.dumps(d) + '\n')
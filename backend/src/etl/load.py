@@ -1,167 +1,125 @@
-import csv
 import os
-from dataclasses import dataclass
-
-from neo4j import GraphDatabase
-
-uri = os.environ["NEO4J_URI"]
-username = os.environ.get["NEO4J_USERNAME"]
-password = os.environ.get["NEO4J_PASSWORD"]
+from collections import defaultdict
+from itertools import batched
+from typing import Iterable
 
+from neo4j import GraphDatabase, Session
 
-@dataclass
-class Property:
-    name: str
-    value: str | int
-
-    @classmethod
-    def from_header_and_value(cls, header: str, value: str) -> 'Property':
-        split_header = header.split(':')
-        _type = split_header[1] if len(split_header) == 2 else str
+from codec import read_csv
+from schema import CHARACTERS, EPISODES, RECAP_PARTS, RECAP_PART_EMBEDDINGS, THEMES, EDGES, THEME_EMBEDDINGS
 
-        if _type == 'int':
-            value = int(value)
-
-        return Property(split_header[0], value)
-
-
-@dataclass
-class Node:
-    label: str
-    semantic_id: str
-    properties: list[Property]
-
-    @classmethod
-    def from_dict(cls, d: dict[str, str], label: str) -> 'Node':
-        return cls(label=label, semantic_id=d['id'], properties=cls._build_properties(d))
-
-    def build_create_statement(self):
-        return f'CREATE (:{self.label} {{id: "{self.semantic_id}"{self._build_properties_placeholders()}}})'
-
-    def properties_dict(self) -> dict[str, any]:
-        return {
-            p.name: p.value for p in self.properties
-        }
-
-    def _build_properties_for_create_statement(self) -> str:
-        return ', ' + ', '.join(
-            f'{p.name}: "{p.value}"' if type(p.value) is str else f'{p.name}: {p.value}' for p in self.properties)
-
-    def _build_properties_placeholders(self) -> str:
-        return ', ' + ', '.join(f'{p.name}: ${p.name}' for p in self.properties)
-
-    @staticmethod
-    def _build_properties(d: dict[str, str]) -> list[Property]:
-        return [
-            Property.from_header_and_value(key, value)
-            for key, value
-            in d.items()
-            if key not in ['label', 'id']
-        ]
-
-
-@dataclass
-class Edge:
-    label: str
-    from_id: str
-    to_id: str
-    properties: list[Property]
-
-    @classmethod
-    def from_dict(cls, d: dict[str, str]) -> 'Edge':
-        return cls(label=d['label'], from_id=d['source_id'], to_id=d['target_id'], properties=cls._build_properties(d))
-
-    def build_create_statement(self):
-        return (
-            f'MATCH (a), (b) '
-            f'WHERE a.id="{self.from_id}" AND b.id="{self.to_id}" '
-            f'CREATE (a)-[:{self.label} {{{self._build_properties_placeholders()}}}]->(b)'
-        )
-
-    def properties_dict(self) -> dict[str, any]:
-        return {
-            p.name: p.value for p in self.properties
-        }
-
-    def _build_properties_for_create_statement(self) -> str:
-        return ', ' + ', '.join(
-            f'{p.name}: "{p.value}"' if type(p.value) is str else f'{p.name}: {p.value}' for p in self.properties)
-
-    def _build_properties_placeholders(self) -> str:
-        return ', '.join(f'{p.name}: ${p.name}' for p in self.properties)
-
-    @staticmethod
-    def _build_properties(d: dict[str, str]) -> list[Property]:
-        return [
-            Property.from_header_and_value(key, value)
-            for key, value
-            in d.items()
-            if key not in ['label', 'source_id', 'target_id']
-        ]
-
-
-def load_nodes(path, label: str):
-    print(f'Loading nodes from {path}')
-    with open(path, mode='r', encoding='utf-8') as f:
-        csv_reader = csv.DictReader(f)
-        for row in csv_reader:
-            node = Node.from_dict(row, label)
-            session.execute_write(lambda tx: tx.run(node.build_create_statement(), **node.properties_dict()))
-
-
-def load_edges(path):
-    print(f'Loading edges from {path}')
-    with open(path, mode='r', encoding='utf-8') as f:
-        csv_reader = csv.DictReader(f)
-        for row in csv_reader:
-            edge = Edge.from_dict(row)
-            session.execute_write(lambda tx: tx.run(edge.build_create_statement(), **edge.properties_dict()))
-
-
-def load_theme_embeddings(path: str):
-    print('Loading theme embeddings')
-    with open(path, mode='r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        next(reader, None)  # skip header
-        for row in reader:
-            theme_id = row[0]
-            embedding = [float(v) for v in row[1:]]
-            query = '''
-            MATCH (t:Theme {id: $theme_id})
-            SET t.embedding = $embedding
-            '''
-            session.execute_write(lambda tx: tx.run(query, theme_id=theme_id, embedding=embedding))
-
-
-def create_theme_index():
-    create_index_query = '''
-    CREATE VECTOR INDEX theme_index IF NOT EXISTS
-    FOR (t:Theme)
-    ON t.embedding
-    OPTIONS { indexConfig: {
+BATCH_SIZE = 500
+
+
+def load_nodes(session: Session, rows: Iterable[dict], label: str):
+    print(f'Loading {label} nodes')
+    session.execute_write(lambda tx: tx.run(f'CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.id)'))
+    query = f'UNWIND $rows AS row CREATE (n:{label}) SET n = row'
+    for batch in batched(rows, BATCH_SIZE):
+        session.execute_write(lambda tx: tx.run(query, rows=batch))
+
+
+def load_edges(session: Session, rows: Iterable[dict], source_label: str, target_label: str):
+    print(f'Loading edges from {source_label} to {target_label}')
+    rows_by_label = defaultdict(list)
+    for row in rows:
+        rows_by_label[row['label']].append(row)
+
+    for label, label_rows in rows_by_label.items():
+        query = f'''
+        UNWIND $rows AS row
+        MATCH (a:{source_label} {{id: row.source_id}}), (b:{target_label} {{id: row.target_id}})
+        CREATE (a)-[:{label}]->(b)
+        '''
+        for batch in batched(label_rows, BATCH_SIZE):
+            session.execute_write(lambda tx: tx.run(query, rows=batch))
+
+
+def load_embeddings(session: Session, rows: Iterable[dict], label: str):
+    print(f'Loading {label} embeddings')
+    query = f'''
+    UNWIND $rows AS row
+    MATCH (n:{label} {{id: row.id}})
+    SET n.embedding = row.embedding
+    '''
+    for batch in batched(rows, BATCH_SIZE):
+        session.execute_write(lambda tx: tx.run(query, rows=batch))
+
+
+def create_vector_index(session: Session, index_name: str, label: str):
+    create_index_query = f'''
+    CREATE VECTOR INDEX {index_name} IF NOT EXISTS
+    FOR (n:{label})
+    ON n.embedding
+    OPTIONS {{ indexConfig: {{
      `vector.dimensions`: 1536,
      `vector.similarity_function`: 'cosine'
-    }}
+    }}}}
     '''
 
-    print('Creating theme index')
+    print(f'Creating {index_name}')
     session.execute_write(lambda tx: tx.run(create_index_query))
 
 
-if __name__ == '__main__':
+def drop_index(session: Session, index_name: str):
+    print(f'Dropping {index_name}')
+    session.execute_write(lambda tx: tx.run(f'DROP INDEX {index_name} IF EXISTS'))
+
+
+def stamp_load(session: Session):
+    # Lets the API tell that the graph was reloaded and its theme store snapshot is stale
+    print('Stamping load')
+    session.execute_write(lambda tx: tx.run('CREATE (:GraphLoad {id: randomUUID(), loaded_at: datetime()})'))
+
+
+def load_graph(
+        characters: Iterable[dict],
+        episodes: Iterable[dict],
+        recap_parts: Iterable[dict],
+        themes: Iterable[dict],
+        transformed_relations: Iterable[dict],
+        recap_edges: Iterable[dict],
+        appearances: Iterable[dict],
+        has_themes: Iterable[dict],
+        themes_embeddings: Iterable[dict],
+        recap_parts_embeddings: Iterable[dict]
+):
+    uri = os.environ["NEO4J_URI"]
+    username = os.environ["NEO4J_USERNAME"]
+    password = os.environ["NEO4J_PASSWORD"]
+
     with GraphDatabase.driver(uri, auth=(username, password)) as driver:
         with driver.session() as session:
             session.execute_write(lambda tx: tx.run("MATCH (n) DETACH DELETE n"))  # Removes everything in the graph
 
-            load_nodes('data/characters.csv', 'Character')
-            load_nodes('data/episodes.csv', 'Episode')
-            load_nodes('data/recap_parts.csv', 'RecapPart')
-            load_nodes('data/themes.csv', 'Theme')
-            #
-            load_edges('data/transformed_relations.csv')
-            load_edges('data/recap_edges.csv')
-            load_edges('data/appearances.csv')
-            load_edges('data/has_themes.csv')
-
-            load_theme_embeddings('data/themes_embeddings.csv')
-            create_theme_index()
+            load_nodes(session, characters, 'Character')
+            load_nodes(session, episodes, 'Episode')
+            load_nodes(session, recap_parts, 'RecapPart')
+            load_nodes(session, themes, 'Theme')
+
+            load_edges(session, transformed_relations, 'Character', 'Character')
+            load_edges(session, recap_edges, 'Episode', 'RecapPart')
+            load_edges(session, appearances, 'Character', 'Episode')
+            load_edges(session, has_themes, 'Episode', 'Theme')
+
+            load_embeddings(session, themes_embeddings, 'Theme')
+            create_vector_index(session, 'theme_index', 'Theme')
+            load_embeddings(session, recap_parts_embeddings, 'RecapPart')
+            # Recap parts are only matched against in the API's theme store, earlier loads created an index for them
+            drop_index(session, 'recap_part_index')
+            stamp_load(session)
+
+
+if __name__ == '__main__':
+    load_graph(
+        characters=read_csv('data/characters.csv', CHARACTERS),
+        episodes=read_csv('data/episodes.csv', EPISODES),
+        recap_parts=read_csv('data/recap_parts.csv', RECAP_PARTS),
+        themes=read_csv('data/themes.csv', THEMES),
+        transformed_relations=read_csv('data/transformed_relations.csv', EDGES),
+        recap_edges=read_csv('data/recap_edges.csv', EDGES),
+        appearances=read_csv('data/appearances.csv', EDGES),
+        has_themes=read_csv('data/has_themes.csv', EDGES),
+        themes_embeddings=read_csv('data/themes_embeddings.csv', THEME_EMBEDDINGS),
+        recap_parts_embeddings=read_csv('data/recap_parts_embeddings.csv', RECAP_PART_EMBEDDINGS)
+    )
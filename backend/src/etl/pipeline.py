@@ -0,0 +1,192 @@
+import argparse
+import os
+from dataclasses import dataclass
+from typing import Callable
+
+from codec import read_table, write_table
+from schema import (Schema, CHARACTERS, EDGES, EPISODES, EPISODE_THEMES, RECAP_PARTS, RECAP_PART_EMBEDDINGS,
+                    RELATIONS, THEMES, THEME_EMBEDDINGS)
+from table import Table
+
+
+@dataclass(frozen=True)
+class Dataset:
+    name: str
+    schema: Schema
+    filename: str
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    inputs: tuple[str, ...]
+    outputs: tuple[str, ...]
+    run: Callable[..., tuple[list[dict], ...]]
+
+
+class Pipeline:
+    def __init__(self, datasets: list[Dataset], stages: list[Stage], data_dir='data', persist=True):
+        self._datasets = {d.name: d for d in datasets}
+        self._stages = {s.name: s for s in stages}
+        self._producers = {output: s for s in stages for output in s.outputs}
+        self._data_dir = data_dir
+        self._persist = persist
+        self._tables: dict[str, Table] = {}
+
+    def run(self, targets: list[str], rebuild: set[str] = frozenset()) -> dict[str, Table]:
+        dirty = self._find_dirty_stages(targets, rebuild)
+        for target in targets:
+            self._run_stage(self._stages[target], dirty)
+        return self._tables
+
+    def _find_dirty_stages(self, targets: list[str], rebuild: set[str]) -> set[str]:
+        dirty = set()
+        visited = set()
+
+        def visit(stage: Stage, path: tuple[str, ...]) -> bool:
+            if stage.name in path:
+                raise ValueError(f'Cycle in pipeline: {" -> ".join(path + (stage.name,))}')
+            if stage.name in visited:
+                return stage.name in dirty
+
+            upstream_dirty = [visit(self._producers[i], path + (stage.name,)) for i in stage.inputs]
+            missing_outputs = not all(os.path.exists(self._path(o)) for o in stage.outputs)
+            if stage.name in rebuild or stage.name in targets or missing_outputs or any(upstream_dirty):
+                dirty.add(stage.name)
+            visited.add(stage.name)
+            return stage.name in dirty
+
+        for target in targets:
+            visit(self._stages[target], ())
+        return dirty
+
+    def _run_stage(self, stage: Stage, dirty: set[str]):
+        inputs = [self._get_table(i, dirty) for i in stage.inputs]
+        print(f'Running stage {stage.name}')
+        outputs = stage.run(*(t.rows() for t in inputs)) or ()
+
+        for name, rows in zip(stage.outputs, outputs):
+            dataset = self._datasets[name]
+            table = Table.from_rows(dataset.schema, rows)
+            self._tables[name] = table
+            if self._persist:
+                write_table(self._path(name), table)
+
+    def _get_table(self, name: str, dirty: set[str]) -> Table:
+        if name not in self._tables:
+            producer = self._producers[name]
+            if producer.name in dirty:
+                self._run_stage(producer, dirty)
+            else:
+                self._tables[name] = read_table(self._path(name), self._datasets[name].schema)
+        return self._tables[name]
+
+    def _path(self, dataset_name: str) -> str:
+        return os.path.join(self._data_dir, self._datasets[dataset_name].filename)
+
+
+def extract_episodes():
+    from extract import get_episodes
+    return get_episodes(),
+
+
+def extract_recap_parts(episodes):
+    from extract import get_recap_parts
+    return get_recap_parts(list(episodes)),
+
+
+def extract_appearances(episodes):
+    from extract import get_appearances
+    return get_appearances(list(episodes)),
+
+
+def extract_characters():
+    from extract import get_characters
+    return get_characters(),
+
+
+def extract_relations(characters):
+    from extract import get_relations
+    return get_relations(list(characters)),
+
+
+def extract_themes(recap_parts):
+    from extract_themes import extract_episode_themes
+    return extract_episode_themes(recap_parts),
+
+
+def transform_recap_edges(recap_parts):
+    from transform import create_recap_edges
+    return create_recap_edges(recap_parts),
+
+
+def transform_relations(relations):
+    from transform import RelationTransformer
+    return RelationTransformer().transform_relation(relations),
+
+
+def transform_themes(episode_themes):
+    from transform import ThemeTransformer
+    return ThemeTransformer.transform_themes(episode_themes)
+
+
+def embed_themes(themes):
+    from embed_themes import embed_themes
+    return embed_themes(themes),
+
+
+def embed_recap_parts(recap_parts):
+    from embed_themes import embed_recap_parts
+    return embed_recap_parts(recap_parts),
+
+
+def load(*tables):
+    from load import load_graph
+    load_graph(*tables)
+
+
+DATASETS = [
+    Dataset('episodes', EPISODES, 'episodes.csv'),
+    Dataset('recap_parts', RECAP_PARTS, 'recap_parts.csv'),
+    Dataset('appearances', EDGES, 'appearances.csv'),
+    Dataset('characters', CHARACTERS, 'characters.csv'),
+    Dataset('relations', RELATIONS, 'relations.csv'),
+    Dataset('episode_themes', EPISODE_THEMES, 'themes.jsonl'),
+    Dataset('recap_edges', EDGES, 'recap_edges.csv'),
+    Dataset('transformed_relations', EDGES, 'transformed_relations.csv'),
+    Dataset('themes', THEMES, 'themes.csv'),
+    Dataset('has_themes', EDGES, 'has_themes.csv'),
+    Dataset('themes_embeddings', THEME_EMBEDDINGS, 'themes_embeddings.csv'),
+    Dataset('recap_parts_embeddings', RECAP_PART_EMBEDDINGS, 'recap_parts_embeddings.csv'),
+]
+
+STAGES = [
+    Stage('extract_episodes', (), ('episodes',), extract_episodes),
+    Stage('extract_recap_parts', ('episodes',), ('recap_parts',), extract_recap_parts),
+    Stage('extract_appearances', ('episodes',), ('appearances',), extract_appearances),
+    Stage('extract_characters', (), ('characters',), extract_characters),
+    Stage('extract_relations', ('characters',), ('relations',), extract_relations),
+    Stage('extract_themes', ('recap_parts',), ('episode_themes',), extract_themes),
+    Stage('transform_recap_edges', ('recap_parts',), ('recap_edges',), transform_recap_edges),
+    Stage('transform_relations', ('relations',), ('transformed_relations',), transform_relations),
+    Stage('transform_themes', ('episode_themes',), ('themes', 'has_themes'), transform_themes),
+    Stage('embed_themes', ('themes',), ('themes_embeddings',), embed_themes),
+    Stage('embed_recap_parts', ('recap_parts',), ('recap_parts_embeddings',), embed_recap_parts),
+    Stage(
+        'load',
+        ('characters', 'episodes', 'recap_parts', 'themes', 'transformed_relations', 'recap_edges', 'appearances',
+         'has_themes', 'themes_embeddings', 'recap_parts_embeddings'),
+        (),
+        load
+    ),
+]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the ETL stages needed to produce the target stages')
+    parser.add_argument('targets', nargs='*', default=['load'], help='Stages to run (default: load)')
+    parser.add_argument('--rebuild', nargs='*', default=[], help='Stages to re-run even if their outputs exist')
+    parser.add_argument('--no-persist', action='store_true', help='Keep intermediate datasets in memory only')
+    args = parser.parse_args()
+
+    Pipeline(DATASETS, STAGES, persist=not args.no_persist).run(args.targets, set(args.rebuild))
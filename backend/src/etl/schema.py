@@ -0,0 +1,111 @@
+import json
+from dataclasses import dataclass
+from enum import Enum
+
+
+class ColumnType(Enum):
+    STR = 'str'
+    INT = 'int'
+    FLOAT = 'float'
+    STR_LIST = 'str[]'
+    FLOAT_VECTOR = 'float[]'
+    JSON = 'json'
+
+    def encode(self, value) -> str:
+        if self in (ColumnType.STR_LIST, ColumnType.FLOAT_VECTOR, ColumnType.JSON):
+            return json.dumps(value, ensure_ascii=False)
+        return '' if value is None else str(value)
+
+    def decode(self, value: str):
+        match self:
+            case ColumnType.STR:
+                return value
+            case ColumnType.INT:
+                return int(value)
+            case ColumnType.FLOAT:
+                return float(value)
+            case ColumnType.STR_LIST | ColumnType.JSON:
+                return json.loads(value)
+            case ColumnType.FLOAT_VECTOR:
+                return [float(v) for v in json.loads(value)]
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: ColumnType = ColumnType.STR
+
+
+@dataclass(frozen=True)
+class Schema:
+    name: str
+    columns: tuple[Column, ...]
+
+    @property
+    def column_names(self) -> list[str]:
+        return [c.name for c in self.columns]
+
+    def encode_row(self, row: dict) -> list[str]:
+        return [c.type.encode(row[c.name]) for c in self.columns]
+
+    def decode_row(self, values: list[str]) -> dict:
+        return {c.name: c.type.decode(v) for c, v in zip(self.columns, values)}
+
+
+EPISODES = Schema('episodes', (
+    Column('id'),
+    Column('season', ColumnType.INT),
+    Column('episode', ColumnType.INT),
+    Column('title'),
+    Column('wiki_url'),
+))
+
+CHARACTERS = Schema('characters', (
+    Column('name'),
+    Column('id'),
+))
+
+RECAP_PARTS = Schema('recap_parts', (
+    Column('id'),
+    Column('episode_id'),
+    Column('index', ColumnType.INT),
+    Column('text'),
+))
+
+RELATIONS = Schema('relations', (
+    Column('source_id'),
+    Column('label'),
+    Column('target_id'),
+    Column('relation_type'),
+))
+
+EPISODE_THEMES = Schema('episode_themes', (
+    Column('episode_id'),
+    Column('themes', ColumnType.JSON),
+))
+
+THEMES = Schema('themes', (
+    Column('id'),
+    Column('episode_id'),
+    Column('type'),
+    Column('title'),
+    Column('description'),
+    Column('explanation'),
+    Column('supporting_quotes', ColumnType.STR_LIST),
+))
+
+THEME_EMBEDDINGS = Schema('themes_embeddings', (
+    Column('id'),
+    Column('embedding', ColumnType.FLOAT_VECTOR),
+))
+
+RECAP_PART_EMBEDDINGS = Schema('recap_parts_embeddings', (
+    Column('id'),
+    Column('embedding', ColumnType.FLOAT_VECTOR),
+))
+
+EDGES = Schema('edges', (
+    Column('source_id'),
+    Column('label'),
+    Column('target_id'),
+))
@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from schema import Schema
+
+
+@dataclass
+class Table:
+    schema: Schema
+    columns: dict[str, list]
+
+    @classmethod
+    def from_rows(cls, schema: Schema, rows: Iterable[dict]) -> 'Table':
+        columns = {name: [] for name in schema.column_names}
+        for row in rows:
+            for name, values in columns.items():
+                values.append(row[name])
+        return cls(schema, columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), []))
+
+    def column(self, name: str) -> list:
+        return self.columns[name]
+
+    def rows(self) -> Iterator[dict]:
+        names = self.schema.column_names
+        for values in zip(*(self.columns[name] for name in names)):
+            yield dict(zip(names, values))
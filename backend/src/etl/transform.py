@@ -1,27 +1,23 @@
-import csv
-import json
 import re
+from typing import Iterable
 
+from codec import read_csv, read_jsonl, write_csv
+from schema import Schema, EDGES, EPISODE_THEMES, RECAP_PARTS, RELATIONS, THEMES
 
-def save_csv(filename: str, items: list[dict]):
-    with open(f'data/{filename}.csv', mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=items[0].keys())
-        writer.writeheader()
-        for item in items:
-            writer.writerow(item)
-
-
-def create_recap_edges():
-    with open('data/recap_parts.csv', encoding='utf-8', mode='r') as f:
-        reader = csv.DictReader(f)
-        return [
-            {
-                'source_id': line['episode_id'],
-                'label': 'HAS_RECAP_PART',
-                'target_id': line['id']
-            }
-            for line in reader
-        ]
+
+def save_csv(filename: str, schema: Schema, items: list[dict]):
+    write_csv(f'data/{filename}.csv', schema, items)
+
+
+def create_recap_edges(recap_parts: Iterable[dict]) -> list[dict]:
+    return [
+        {
+            'source_id': part['episode_id'],
+            'label': 'HAS_RECAP_PART',
+            'target_id': part['id']
+        }
+        for part in recap_parts
+    ]
 
 
 class RelationTransformer:
@@ -36,37 +32,41 @@ class RelationTransformer:
             'daughter',
             'son'
         ]
+        self._relation_type_patterns = [
+            (re.compile(fr'(?<![-\w])\b{t}\b(?![-\w])'), f'IS_{t.upper()}_OF')
+            for t in self.relative_relation_types
+        ]
 
     def get_new_label(self, relation_type: str) -> str | None:
-        for t in self.relative_relation_types:
-            if bool(re.search(fr'(?<![-\w])\b{t}\b(?![-\w])', relation_type)) and 'law' not in relation_type:
-                return f'IS_{t.upper()}_OF'
+        if 'law' in relation_type:
+            return None
+        for pattern, label in self._relation_type_patterns:
+            if pattern.search(relation_type):
+                return label
         return None
 
-    def transform_relation(self):
-        with open('data/relations.csv', encoding='utf-8', mode='r') as f:
-            reader = csv.DictReader(f)
-            new_relations = []
-            for relation in reader:
-                relation_label = relation['label']
-                relation_type = relation['relation_type']
-
-                if relation_label == 'IS_RELATIVE_OF':
-                    new_label = self.get_new_label(relation_type)
-                    if new_label:
-                        new_relations.append({
-                            'source_id': relation['source_id'],
-                            'label': new_label,
-                            'target_id': relation['target_id'],
-                        })
-                else:
+    def transform_relation(self, relations: Iterable[dict]) -> list[dict]:
+        new_relations = []
+        for relation in relations:
+            relation_label = relation['label']
+            relation_type = relation['relation_type']
+
+            if relation_label == 'IS_RELATIVE_OF':
+                new_label = self.get_new_label(relation_type)
+                if new_label:
                     new_relations.append({
                         'source_id': relation['source_id'],
-                        'label': relation['label'],
+                        'label': new_label,
                         'target_id': relation['target_id'],
                     })
+            else:
+                new_relations.append({
+                    'source_id': relation['source_id'],
+                    'label': relation['label'],
+                    'target_id': relation['target_id'],
+                })
 
-            return new_relations
+        return new_relations
 
 
 class ThemeTransformer:
@@ -79,43 +79,41 @@ class ThemeTransformer:
         }[t]
 
     @staticmethod
-    def transform_themes():
+    def transform_themes(episode_themes: Iterable[dict]) -> tuple[list[dict], list[dict]]:
         theme_nodes = []
         has_theme_edges = []
 
-        with open('data/themes.jsonl', mode='r') as f:
-            for line in f.readlines():
-                d = json.loads(line)
-                episode_id = d['episode_id']
-                for theme in d['themes']:
-                    theme_id = f'Theme:{episode_id}:{ThemeTransformer.get_theme_title(theme["theme"])}'
-                    theme_node = {
-                        'id': theme_id,
-                        'episode_id': episode_id,
-                        'type': ThemeTransformer.get_theme_title(theme["theme"]),
-                        'title': theme['title'],
-                        'description': theme["description"],
-                        'explanation': theme['explanation'],
-                        'supporting_quotes': '; '.join(theme['supporting_quotes'])
-                    }
-                    theme_nodes.append(theme_node)
-
-                    has_theme_edges.append({
-                        'source_id': episode_id,
-                        'label': 'HAS_THEME',
-                        'target_id': theme_id
-                    })
-
-            return theme_nodes, has_theme_edges
+        for d in episode_themes:
+            episode_id = d['episode_id']
+            for theme in d['themes']:
+                theme_id = f'Theme:{episode_id}:{ThemeTransformer.get_theme_title(theme["theme"])}'
+                theme_node = {
+                    'id': theme_id,
+                    'episode_id': episode_id,
+                    'type': ThemeTransformer.get_theme_title(theme["theme"]),
+                    'title': theme['title'],
+                    'description': theme["description"],
+                    'explanation': theme['explanation'],
+                    'supporting_quotes': theme['supporting_quotes']
+                }
+                theme_nodes.append(theme_node)
+
+                has_theme_edges.append({
+                    'source_id': episode_id,
+                    'label': 'HAS_THEME',
+                    'target_id': theme_id
+                })
+
+        return theme_nodes, has_theme_edges
 
 
 if __name__ == '__main__':
-    recap_edges = create_recap_edges()
-    save_csv('recap_edges', recap_edges)
+    recap_edges = create_recap_edges(read_csv('data/recap_parts.csv', RECAP_PARTS))
+    save_csv('recap_edges', EDGES, recap_edges)
 
-    transformed_relations = RelationTransformer().transform_relation()
-    save_csv('transformed_relations', transformed_relations)
+    transformed_relations = RelationTransformer().transform_relation(read_csv('data/relations.csv', RELATIONS))
+    save_csv('transformed_relations', EDGES, transformed_relations)
 
-    themes, has_theme_edges = ThemeTransformer().transform_themes()
-    save_csv('themes', themes)
-    save_csv('has_themes', has_theme_edges)
+    themes, has_theme_edges = ThemeTransformer().transform_themes(read_jsonl('data/themes.jsonl', EPISODE_THEMES))
+    save_csv('themes', THEMES, themes)
+    save_csv('has_themes', EDGES, has_theme_edges)
@@ -0,0 +1,105 @@
+import asyncio
+
+from api.models import Theme
+from api.services.coalescing import SingleFlight
+from api.services.deadline import Deadline
+from api.services.themes import ThemesService
+
+
+class SlowCall:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self, *_, **__):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return 'answer'
+
+
+def test_call_is_shared_between_callers():
+    single_flight = SingleFlight('test')
+    call = SlowCall(0.05)
+
+    async def run():
+        return await asyncio.gather(single_flight.do('key', call), single_flight.do('key', call))
+
+    assert asyncio.run(run()) == ['answer', 'answer']
+    assert call.started == 1
+
+
+def test_call_survives_while_someone_still_waits():
+    single_flight = SingleFlight('test')
+    call = SlowCall(0.1)
+
+    async def run():
+        impatient = asyncio.ensure_future(asyncio.wait_for(single_flight.do('key', call), 0.01))
+        patient = asyncio.ensure_future(single_flight.do('key', call))
+        await asyncio.gather(impatient, return_exceptions=True)
+        return await patient
+
+    assert asyncio.run(run()) == 'answer'
+    assert call.cancelled == 0
+
+
+def test_call_is_cancelled_when_the_last_caller_gives_up():
+    single_flight = SingleFlight('test')
+    call = SlowCall(1)
+
+    async def run():
+        results = await asyncio.gather(
+            asyncio.wait_for(single_flight.do('key', call), 0.01),
+            asyncio.wait_for(single_flight.do('key', call), 0.02),
+            return_exceptions=True
+        )
+        await asyncio.sleep(0)
+        # Checked before asyncio.run() returns, since it cancels whatever is still running on the way out
+        assert call.cancelled == 1
+        return results
+
+    assert all(isinstance(r, TimeoutError) for r in asyncio.run(run()))
+    # A later caller starts the work afresh instead of joining the cancelled call
+    call.seconds = 0
+    assert asyncio.run(single_flight.do('key', call)) == 'answer'
+
+
+class FakeLlmService:
+    def __init__(self, completion: SlowCall):
+        self.query_gpt4o_mini = completion
+
+    async def create_embedding(self, *_, **__) -> list[float]:
+        return [1.0]
+
+
+class FakeThemeStore:
+    is_loaded = True
+    version = 'test'
+
+    def find_similar_themes(self, vector, k, mask=None):
+        return [(_theme(i), 1.0) for i in range(k)]
+
+
+def _theme(i: int) -> Theme:
+    return Theme(
+        episode_title='Episode', episode_url='', semantic_id=f'Theme:{i}', title='Title', description='',
+        explanation='', supporting_quotes=[], recap=''
+    )
+
+
+def test_llm_calls_are_cancelled_at_the_deadline():
+    completion = SlowCall(1)
+    themes_service = ThemesService(None, FakeLlmService(completion), FakeThemeStore())
+
+    async def run():
+        response = await themes_service.find_similar_themes('Sharing', k=3, deadline=Deadline.after(0.1))
+        await asyncio.sleep(0.01)  # Cancellation takes a few iterations of the loop to reach the call
+        assert completion.started == 4  # Refine plus one answer per theme
+        assert completion.cancelled == 4
+        return response
+
+    assert all(t.answer_pending for t in asyncio.run(run()).themes)
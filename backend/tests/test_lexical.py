@@ -0,0 +1,53 @@
+import pytest
+
+from api.models import Theme
+from api.services.lexical import LexicalIndex, tokenize
+
+
+@pytest.mark.parametrize('forms', [
+    ['sibling', 'siblings'],
+    ['game', 'games', 'gaming'],
+    ['rule', 'rules'],
+    ['share', 'shares', 'sharing', 'shared'],
+    ['play', 'plays', 'playing', 'played'],
+    ['run', 'runs', 'running'],
+    ['family', 'families'],
+    ['need', 'needs', 'needed'],
+    ['agree', 'agreed', 'agreeing'],
+])
+def test_forms_of_a_word_share_a_token(forms):
+    assert len({tuple(tokenize(form)) for form in forms}) == 1
+
+
+def test_stemming_leaves_short_words_alone():
+    assert tokenize('bring red bus') == ['bring', 'red', 'bus']
+
+
+class FakeThemeStore:
+    def __init__(self, titles: list[str]):
+        self._themes = [
+            Theme(
+                episode_title='Episode', episode_url='', semantic_id=f'Theme:{i}', title=title, description='',
+                explanation='', supporting_quotes=[], recap=''
+            )
+            for i, title in enumerate(titles)
+        ]
+
+    def __len__(self):
+        return len(self._themes)
+
+    def get_theme(self, i: int) -> Theme:
+        return self._themes[i]
+
+
+def test_singular_and_plural_queries_find_the_same_themes():
+    lexical_index = LexicalIndex()
+    lexical_index.build(FakeThemeStore([
+        'Sibling rivalry', 'Siblings sharing toys', 'Playing games together', 'Rules of the game', 'Bedtime'
+    ]))
+
+    assert lexical_index.search('siblings') == lexical_index.search('sibling')
+    assert {i for i, _ in lexical_index.search('siblings')} == {0, 1}
+    assert lexical_index.search('games') == lexical_index.search('game')
+    assert {i for i, _ in lexical_index.search('game')} == {2, 3}
+    assert lexical_index.covers('sharing toys', 1)
@@ -23,12 +23,13 @@ interface ThemeItem {
   title: string;
   episodeTitle: string;
   episodeUrl: string;
-  score: number;
+  score: number | null;
   explanation: string;
   description?: string;
   quotes: string[];
   isBestMatch: boolean;
-  answer: string;
+  answer: string | null;
+  answerPending: boolean;
 }
 
 interface APIResponse {
@@ -49,9 +50,12 @@ interface ThemeResponse {
 interface SimilarThemesResponse {
   themes: {
     theme: ThemeResponse,
-    score: number,
+    score: number | null,
     is_best_match: boolean,
-    answer: string
+    answer: string | null,
+    answer_pending: boolean,
+    match_source: string,
+    lexical_score: number | null
   }[];
 }
 
@@ -87,7 +91,8 @@ const ThemeExplorer: React.FC = () => {
         description: t.theme.description,
         quotes: t.theme.supporting_quotes,
         isBestMatch: t.is_best_match,
-        answer: t.answer
+        answer: t.answer,
+        answerPending: t.answer_pending
       }))
     };
   };
@@ -175,7 +180,7 @@ const ThemeExplorer: React.FC = () => {
                         {item.episodeTitle}
                       </Link>
                       <Typography variant="body2" color="text.secondary" sx={{ ml: 1 }}>
-                        | Score: {item.score.toFixed(2)}
+                        | {item.score !== null ? `Score: ${item.score.toFixed(2)}` : 'Keyword match'}
                       </Typography>
                     </Box>
                   </Box>
@@ -186,7 +191,7 @@ const ThemeExplorer: React.FC = () => {
                 <Box p={2} bgcolor="background.paper">
                   <Box mb={2}>
                     <Typography variant="body2">
-                      {item.answer}
+                      {item.answerPending ? 'This answer took too long to generate. Try searching again.' : item.answer}
                     </Typography>
                   </Box>
                   <Divider style={{ margin: '16px 0' }} />